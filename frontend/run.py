@@ -12,9 +12,13 @@ from flask_sqlalchemy import SQLAlchemy
 from flask import Flask, render_template, request, redirect, url_for, flash, session
 from werkzeug.utils import secure_filename
 
-from project_spectra.Parse_data_MS2 import parse_data_from_MS2
+from project_spectra.Parse_data_MS2 import get_scan_count, get_spectrum, parse_data_from_MS2
 from project_spectra.Spec_peptide import Peptide_identification
 from project_spectra.identifier import Identifier
+from project_spectra.preprocess import parse_preprocess_options
+from project_spectra.cache import ResultCache, cached_compile
+from project_spectra.protein_index import open_index
+from project_spectra.protein_match import LocalBackend
 
 log = logging.getLogger(__name__)
 
@@ -35,6 +39,10 @@ app = Flask(__name__)
 
 FLASK_PORT = os.environ.get('FLASK_PORT', default=5000)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# peak preprocessing before the de novo search, e.g. SPECTRA_PREPROCESS="top_n=10,min_intensity=1"
+app.config['PREPROCESS'] = parse_preprocess_options(os.environ.get('SPECTRA_PREPROCESS'))
+# identification results by file content, scan and parameters (the upload is always saved as ms2.mzML)
+app.config['RESULT_CACHE'] = ResultCache()
 
 app.config['SECRET_KEY'] = "1P313P4OO138O4UQRP9343P4AQEKRFLKEQRAS230"
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///spectra.db'
@@ -60,9 +68,7 @@ def home():
 	filenames = [file for file in filenames]
 	# Check files are uploaded
 	if filenames:
-		exp = MSExperiment()
-		MzMLFile().load(ms2_file, exp)
-		size = len(exp.getSpectra())
+		size = get_scan_count(ms2_file)
 	return render_template('home.html', size = size, my_info ="", data_table ="",
 						   p_mz ='', p_c ="", number_of_peak = "-", min_m_z = "-",
 							max_m_z = "-", max_m_z_peak = "-")
@@ -76,18 +82,18 @@ def parse_spec():
 	# Check files are uploaded
 	if filenames:
 		scan_number = request.form['textbox']
-		exp = MSExperiment()
-		MzMLFile().load(ms2_file, exp)
-		m_z = list(exp.getSpectrum(int(scan_number)).get_peaks()[0])
-		intensity = list(exp.getSpectrum(int(scan_number)).get_peaks()[1])
+		m_z, intensity = get_spectrum(ms2_file, int(scan_number)).get_peaks()
+		m_z = list(m_z)
+		intensity = list(intensity)
 
 		number_of_peak = len(m_z)
 		min_m_z = round(min(m_z), 2)
 		max_m_z_peak = round(m_z[intensity.index(max(intensity))], 2)
 		max_m_z = round(max(m_z), 2)
 
-		precursor_mz = parse_data_from_MS2(ms2_file, int(scan_number))[2]
-		precursor_charge = parse_data_from_MS2(ms2_file, int(scan_number))[3]
+		scan_info = parse_data_from_MS2(ms2_file, int(scan_number))
+		precursor_mz = scan_info[2]
+		precursor_charge = scan_info[3]
 
 		return render_template('home.html', p_mz = precursor_mz, p_c = precursor_charge,
 							   number_of_peak = number_of_peak, min_m_z = min_m_z,
@@ -108,24 +114,21 @@ def plot_png():
 	ms2_file = os.path.join(app.config['UPLOAD_FOLDER'], "ms2.mzML")
 	scan_number = request.form['textbox']
 	p = Peptide_identification(ms2_file, int(scan_number))
-	p.store_one_scan_and_get_deisotoped()
-	exp = MSExperiment()
-	MzMLFile().load(p.deisotoped_file, exp)
-	for spec in exp:
-		for mz, i in zip(*spec.get_peaks()):
-			plt.plot([mz, mz], [0, i], color='black')
-			plt.text(mz, i, str(mz))
-
-		# for the title add RT and Precursor m/z and charge info if available
-		title = ''
-		if spec.getRT() >= 0:
-			title += 'RT: ' + str(spec.getRT())
-		if len(spec.getPrecursors()) >= 1:
-			title += '   Precursor m/z: ' + str(spec.getPrecursors()[0].getMZ()) + '   Charge: ' + str(spec.getPrecursors()[0].getCharge())
-		plt.title(title)
-		plt.ylabel('intensity')
-		plt.xlabel('m/z')
-		plt.ylim(bottom=0)
+	spec = p.deisotoped_scan()
+	for mz, i in zip(*spec.get_peaks()):
+		plt.plot([mz, mz], [0, i], color='black')
+		plt.text(mz, i, str(mz))
+
+	# for the title add RT and Precursor m/z and charge info if available
+	title = ''
+	if spec.getRT() >= 0:
+		title += 'RT: ' + str(spec.getRT())
+	if len(spec.getPrecursors()) >= 1:
+		title += '   Precursor m/z: ' + str(spec.getPrecursors()[0].getMZ()) + '   Charge: ' + str(spec.getPrecursors()[0].getCharge())
+	plt.title(title)
+	plt.ylabel('intensity')
+	plt.xlabel('m/z')
+	plt.ylim(bottom=0)
 
 	img = io.BytesIO()
 	plt.savefig(img, format='png')
@@ -143,9 +146,7 @@ def get_peptide_list():
 	p = Peptide_identification(ms2_file, int(scan_number))
 
 	try:
-		vals = p.compile(show_C_terminal=False)[0]
-		peaks = p.compile(show_C_terminal=False)[1]
-		sum_intensity = p.compile(show_C_terminal=False)[2]
+		vals, peaks, sum_intensity = cached_compile(p, app.config['RESULT_CACHE'], show_C_terminal=False, preprocess=app.config['PREPROCESS'])
 		lst = zip(vals, sum_intensity)
 		show_seq_peak = zip(vals,peaks)
 		result_p = pd.DataFrame(lst, columns=["Sequence", "Sum of Relative Peak Intensity"], dtype=float)
@@ -205,6 +206,11 @@ def allowed_file(filename):
 	return '.' in filename and \
 		filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def uploaded_fasta():
+	"""The last uploaded FASTA file, None if there is none"""
+	fasta_files = [path for path in Path(UPLOAD_FOLDER).iterdir() if path.suffix.lower() in ('.fasta', '.fa')]
+	return str(max(fasta_files, key=lambda path: path.stat().st_mtime)) if fasta_files else None
+
 def clear_all():
 	for root, dirs, files in os.walk(UPLOAD_FOLDER):
 		for file in files:
@@ -216,7 +222,10 @@ def clear_all():
 def protein_matches():
 	# Run protein identification
 	if session['peptides']:
-		i = Identifier(sequence=session['peptides'])
+		fasta = uploaded_fasta()
+		# an uploaded FASTA file, else the SPECTRA_PROTEIN_BACKEND environment variable (default: PeptideMatch API)
+		backend = LocalBackend(open_index(fasta)) if fasta else None
+		i = Identifier(sequence=session['peptides'], backend=backend)
 		result = i.stout
 
 		name = []
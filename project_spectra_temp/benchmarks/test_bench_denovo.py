@@ -0,0 +1,88 @@
+"""Benchmarks of the de novo sequencing hot path.
+   Run with: pytest benchmarks (needs pytest-benchmark: pip install project_spectra[bench])
+   The spectra are scan 3 of data/ms2.mzML and synthetic spectra (project_spectra.synthetic) of increasing peak count.
+"""
+
+import os
+import numpy as np
+import pytest
+from project_spectra.Parse_data_MS2 import clear_experiment_cache, load_experiment, parse_data_from_MS2
+from project_spectra.Spec_peptide import Peptide_identification
+from project_spectra.synthetic import synthetic_spectrum, theoretical_peaks
+
+pytest.importorskip("pytest_benchmark")
+
+MS2_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "data", "ms2.mzML")
+MS2_SCAN = 3
+PEAK_COUNTS = [100, 300, 1000]
+# the number of paths end_to_end_concate builds grows exponentially with the peaks
+CONCATE_PEAK_COUNTS = [100, 300]
+PEPTIDE = "GASPVTLNDKEMHFYWR"
+
+needs_ms2_file = pytest.mark.skipif(not os.path.exists(MS2_FILE), reason="data/ms2.mzML not found")
+
+
+def synthetic_identification(n_peaks: int) -> Peptide_identification:
+    """A doubly charged scan of PEPTIDE with its b/y ladder and noise peaks up to n_peaks in total."""
+    n_noise = max(0, n_peaks - theoretical_peaks(PEPTIDE)[0].size)
+    spec = synthetic_spectrum(PEPTIDE, 2, n_noise, rng=np.random.default_rng(0))
+    precursor = spec.getPrecursors()[0]
+    p = Peptide_identification(None, 0)
+    p.set_peaks(*spec.get_peaks(), precursor.getMZ(), precursor.getCharge())
+    return p
+
+
+def ready_for_dfs(p: Peptide_identification) -> Peptide_identification:
+    """Run the stages before the DFS."""
+    p.normalization(p.scan_peaks())
+    p.precursor_ms()
+    return p
+
+
+@needs_ms2_file
+def test_load_experiment(benchmark):
+    benchmark.pedantic(load_experiment, args=(MS2_FILE,), setup=clear_experiment_cache, rounds=5)
+
+
+@needs_ms2_file
+def test_parse_data_from_MS2(benchmark):
+    load_experiment(MS2_FILE)
+    benchmark(parse_data_from_MS2, MS2_FILE, MS2_SCAN)
+
+
+@needs_ms2_file
+def test_deisotope(benchmark):
+    p = Peptide_identification(MS2_FILE, MS2_SCAN)
+    benchmark(p.deisotope)
+
+
+@needs_ms2_file
+def test_compile_ms2(benchmark):
+    load_experiment(MS2_FILE)
+    # a new instance per call, compile is memoised per instance
+    result = benchmark(lambda: Peptide_identification(MS2_FILE, MS2_SCAN).compile(False))
+    assert result
+
+
+@pytest.mark.parametrize("n_peaks", PEAK_COUNTS)
+def test_get_up_downstream_peak_dict(benchmark, n_peaks):
+    p = ready_for_dfs(synthetic_identification(n_peaks))
+    route_dict = benchmark(p.get_up_downstream_peak_dict, p.norm_dict)
+    benchmark.extra_info["edges"] = sum(len(x) for x in route_dict.values())
+
+
+@pytest.mark.parametrize("n_peaks", CONCATE_PEAK_COUNTS)
+def test_end_to_end_concate(benchmark, n_peaks):
+    p = ready_for_dfs(synthetic_identification(n_peaks))
+    p.get_up_downstream_peak_dict(p.norm_dict)
+    pair_list = p.get_peak_pair()
+    merge_list = benchmark(p.end_to_end_concate, pair_list)
+    benchmark.extra_info["paths"] = len(merge_list)
+
+
+@pytest.mark.parametrize("n_peaks", PEAK_COUNTS)
+def test_compile_synthetic(benchmark, n_peaks):
+    # compile is memoised per instance, so every round gets a fresh one (built outside the timing)
+    result = benchmark.pedantic(Peptide_identification.compile,
+                                setup=lambda: ((synthetic_identification(n_peaks), False), {}), rounds=10)
+    assert result
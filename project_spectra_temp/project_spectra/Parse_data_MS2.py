@@ -3,9 +3,108 @@
    Transform into MS2 file and get m/z and intensity from one scan
 """
 
+import os
 from pyopenms import *
 import pandas as pd
 
+# Parsed experiments and on-disc readers shared by every caller in this process,
+# keyed by absolute file path.
+_experiments = {}
+_indexed_readers = {}
+
+
+def _file_key(input_file: str) -> tuple:
+    """Return the absolute path of a file and the (mtime, size) stamp of its current version."""
+    path = os.path.abspath(input_file)
+    stat = os.stat(path)
+    return path, (stat.st_mtime_ns, stat.st_size)
+
+
+def load_experiment(input_file: str) -> MSExperiment:
+    """
+    Load an mzML file at most once per process.
+    The parsed experiment is cached by absolute path and modification time,
+    so a file that is rewritten on disk is parsed again on the next call.
+    Callers share the returned object and must not modify it.
+    Parameters
+    ----------
+    input_file: str
+            The .mzML file
+    Returns
+    -------
+    MSExperiment
+    """
+    path, key = _file_key(input_file)
+    cached = _experiments.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    exp = MSExperiment()
+    MzMLFile().load(path, exp)
+    _experiments[path] = (key, exp)
+    return exp
+
+
+def open_indexed_experiment(input_file: str):
+    """
+    Open an indexed mzML file for random access through its offset index.
+    Only the spectrum meta data is read; peaks are read from disk when a spectrum is requested.
+    The reader is cached like load_experiment.
+    Parameters
+    ----------
+    input_file: str
+            The .mzML file
+    Returns
+    -------
+    OnDiscMSExperiment, or None if the file has no offset index.
+    """
+    path, key = _file_key(input_file)
+    cached = _indexed_readers.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    reader = OnDiscMSExperiment()
+    if not reader.openFile(path):
+        reader = None
+    _indexed_readers[path] = (key, reader)
+    return reader
+
+
+def get_spectrum(input_file: str, scan_number: int) -> MSSpectrum:
+    """
+    Read one spectrum by its scan number.
+    Indexed files are read in constant memory through the offset index,
+    other files fall back to the shared experiment of load_experiment.
+    """
+    reader = open_indexed_experiment(input_file)
+    if reader is None:
+        return load_experiment(input_file)[scan_number]
+    if not 0 <= scan_number < reader.getNrSpectra():
+        raise IndexError(f"scan number {scan_number} out of range for {input_file}")
+    return reader.getSpectrum(scan_number)
+
+
+def get_scan_count(input_file: str) -> int:
+    """Get the total number of spectra in an mzML file."""
+    reader = open_indexed_experiment(input_file)
+    if reader is None:
+        return load_experiment(input_file).getNrSpectra()
+    return reader.getNrSpectra()
+
+
+def get_ms2_scan_numbers(input_file: str) -> list:
+    """Get the scan numbers of all MS2 spectra in an mzML file, read from the spectrum meta data."""
+    reader = open_indexed_experiment(input_file)
+    exp = load_experiment(input_file) if reader is None else reader.getMetaData()
+    return [i for i in range(exp.getNrSpectra()) if exp.getSpectrum(i).getMSLevel() == 2]
+
+
+def clear_experiment_cache() -> None:
+    """Drop all experiments and readers opened by this module."""
+    _experiments.clear()
+    _indexed_readers.clear()
+
+
 def get_ms2(ms_file: str, output_file: str) -> None:
     """
     Store MS2 file from raw LC-MS/MS mzML file.
@@ -28,16 +127,9 @@ def get_ms2(ms_file: str, output_file: str) -> None:
     return
 
 
-def parse_data_from_MS2(input_file: str, ms2_scan_number: int) -> tuple:
-    """Method used to parse data from one specific scan.
-       RAW DATA."""
-    exp = MSExperiment()
-    MzMLFile().load(input_file, exp)
-    mz = []
-    intensity = []
-    for peak in exp[ms2_scan_number]:
-        mz.append(peak.getMZ())
-        intensity.append(peak.getIntensity())
+def parse_spectrum(spec: MSSpectrum) -> tuple:
+    """Parse m/z, intensity and precursor info from one spectrum."""
+    mz, intensity = spec.get_peaks()
 
     # raw MS2 dataFrame (m/z and intensity):
     df = pd.DataFrame(columns=['M/Z', 'Intensity'])
@@ -46,6 +138,12 @@ def parse_data_from_MS2(input_file: str, ms2_scan_number: int) -> tuple:
 
     mz_int = {x: y for x, y in zip(mz, intensity)}
 
-    pre_mz = exp[ms2_scan_number].getPrecursors()[0].getMZ()
-    pre_charge = exp[ms2_scan_number].getPrecursors()[0].getCharge()
+    pre_mz = spec.getPrecursors()[0].getMZ()
+    pre_charge = spec.getPrecursors()[0].getCharge()
     return df, mz_int, pre_mz, pre_charge
+
+
+def parse_data_from_MS2(input_file: str, ms2_scan_number: int) -> tuple:
+    """Method used to parse data from one specific scan.
+       RAW DATA."""
+    return parse_spectrum(get_spectrum(input_file, ms2_scan_number))
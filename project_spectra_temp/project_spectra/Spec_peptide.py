@@ -3,13 +3,29 @@
     The output is a list contains possible peptides.
 """
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from pyopenms import *
-from project_spectra.Parse_data_MS2 import parse_data_from_MS2
+from project_spectra.Parse_data_MS2 import get_spectrum, parse_spectrum
+from project_spectra.beam import beam_search
+from project_spectra.graph import SpectrumGraph
+from project_spectra.peaks import PeakArray
+from project_spectra.preprocess import preprocess_peaks
+from project_spectra.residues import (AA_CODE, AA_LIST, AA_MASSES, AA_MASS_SET, AA_MONO_MASS, H2O_MASS, MONO_MASSES,
+                                      NH3_MASS, PROTON_MASS, TOLERANCE_UNITS, aa_of_mass, aa_of_mono_mass, is_aa_mass,
+                                      is_mono_aa_mass, tolerance_da)
+from project_spectra.stats import ScanStats
 from project_spectra.startup import data_path
 from collections import defaultdict
-import itertools
+
+# De novo search algorithms of Peptide_identification.compile
+ALGORITHMS = ("graph", "beam")
+
+# failure reasons of the scans rejected before the search
+UNKNOWN_CHARGE = "unknown precursor charge, scan skipped."
+TOO_FEW_PEAKS = "too few peaks, scan skipped."
+NO_LADDER = "too few peaks differ by an amino acid mass, scan skipped."
 
 
 class Spectrum_processing():
@@ -19,85 +35,181 @@ class Spectrum_processing():
         self.raw_file = data_path + f"/{self.s_number}_full.mzML"
         self.deisotoped_file = data_path + f"/{self.s_number}_deisotoped.mzML"
         self.plot_file = data_path + f"/{self.s_number}_deisotoped.jpg"
-
-    def store_one_scan_and_get_deisotoped(self) -> None:
-        """This method is used to deisotope peaks for plotting and store specific (scan number) raw spectrum to .ML file"""
+        self._spectrum = None
+        self._scan_data = None
+        # the deisotoped spectrum, shared by the search, the export and the plot (see deisotoped_scan)
+        self.deisotoped_spectrum = None
+        # (parameters, result) of the last compile, see Peptide_identification.compile
+        self._compiled = None
+        self._exported = False
+        # wall time per stage and counters of the last identification
+        self.stats = ScanStats(ms2_scan_number)
+        # None: nominal (integer) masses; a value: monoisotopic masses within this tolerance
+        self.mass_tolerance = None
+        self.tolerance_unit = "ppm"
+
+    def set_mass_tolerance(self, mass_tolerance: float = None, tolerance_unit: str = "ppm") -> None:
+        """Switch between nominal masses (mass_tolerance None) and the high-accuracy mode,
+           which compares monoisotopic masses within mass_tolerance (in "ppm" or "Da")."""
+        if tolerance_unit not in TOLERANCE_UNITS:
+            raise ValueError(f"Unknown tolerance unit '{tolerance_unit}', use one of {TOLERANCE_UNITS}")
+        self.mass_tolerance = mass_tolerance
+        self.tolerance_unit = tolerance_unit
+
+    def tolerance(self, mz):
+        """Absolute tolerance (Da) of the high-accuracy mode at m/z."""
+        return tolerance_da(mz, self.mass_tolerance, self.tolerance_unit)
+
+    def scan_spectrum(self) -> MSSpectrum:
+        """Get the spectrum of this scan, read once from the MS2 file (or given by set_peaks)."""
+        if self._spectrum is None:
+            self._spectrum = get_spectrum(self.ms2_file, self.s_number)
+        return self._spectrum
+
+    def deisotope(self, keep_only_deisotoped: bool = False) -> tuple:
+        """Deisotope the peaks in memory and keep the deisotoped, single charged spectrum.
+           The peaks without an isotope pattern are kept (they are most of the fragment ladder),
+           keep_only_deisotoped drops them.
+           Return the m/z and intensity arrays of the deisotoped peaks."""
         min_isotopes = 2
         max_isotopes = 10
         use_decreasing_model = True
         start_intensity_check = 3
 
-        e = MSExperiment()
-        MzMLFile().load(self.ms2_file, e)
-        s = e[self.s_number]
+        full = self.scan_spectrum()
+        s = MSSpectrum(full)
         s.setFloatDataArrays([])
-        Deisotoper.deisotopeAndSingleCharge(s, 0.1, False, 1, 3, True,
+        Deisotoper.deisotopeAndSingleCharge(s, 0.1, False, 1, 3, keep_only_deisotoped,
                                             min_isotopes, max_isotopes,
                                             True, True, True,
                                             use_decreasing_model, start_intensity_check, False)
 
         # use two variables to store the size of each scan
-        self.full_scan_size = e[self.s_number].size()
+        self.full_scan_size = full.size()
         self.de_scan_size = s.size()
 
+        self.deisotoped_spectrum = s
+        self.deisotoped_peaks = s.get_peaks()
+        return self.deisotoped_peaks
+
+    def deisotoped_scan(self) -> MSSpectrum:
+        """Get the deisotoped spectrum of this scan, deisotoped once (deisotope)."""
+        if self.deisotoped_spectrum is None:
+            self.deisotope()
+        return self.deisotoped_spectrum
+
+    def store_one_scan_and_get_deisotoped(self) -> None:
+        """This method is used to store specific (scan number) raw and deisotoped spectrum to .ML files.
+           Only needed to export the scan for debugging, the identification works in memory."""
+        self.deisotoped_scan()
+
         # store specific scan to new .ML files.
         e2 = MSExperiment()
-        e2.addSpectrum(e[self.s_number])
+        e2.addSpectrum(self.scan_spectrum())
         MzMLFile().store(self.raw_file, e2)
 
         e2 = MSExperiment()
-        e2.addSpectrum(s)
+        e2.addSpectrum(self.deisotoped_spectrum)
         MzMLFile().store(self.deisotoped_file, e2)
         return
 
     def normalization(self, peak_dict: dict) -> dict:
-        """Normalize the intensity as relative abundance"""
+        """Normalize the intensity as relative abundance.
+           A PeakArray is normalized as arrays, a plain dict stays a dict."""
+        if isinstance(peak_dict, PeakArray):
+            self.norm_dict = peak_dict.normalized()
+            return self.norm_dict
         max_value = max(list(peak_dict.values()))
         self.norm_dict = {x: (y/max_value)*100 for x, y in peak_dict.items()}
         return self.norm_dict
 
+    def scan_peaks(self) -> PeakArray:
+        """get the peaks of this scan as sorted m/z and intensity arrays."""
+        return PeakArray(*self.scan_spectrum().get_peaks())
+
+    def search_peaks(self, use_deisotoped: bool = True) -> PeakArray:
+        """The peaks the search runs on: the deisotoped, charge-collapsed peaks (the peaks without
+           an isotope pattern are kept, they are most of the fragment ladder) or the raw peaks of the scan."""
+        if not use_deisotoped:
+            return self.scan_peaks()
+        with self.stats.stage("deisotope"):
+            self.deisotoped_scan()
+        self.stats.count("peaks_deisotoped", self.de_scan_size)
+        return PeakArray(*self.deisotoped_peaks)
+
+    def scan_data(self) -> tuple:
+        """Parse the scan once and keep its dataframe, m/z -> intensity dict, precursor m/z and charge."""
+        if self._scan_data is None:
+            self._scan_data = parse_spectrum(self.scan_spectrum())
+        return self._scan_data
+
+    def set_peaks(self, mz, intensity, precursor_mz: float, precursor_charge: int) -> None:
+        """Use in-memory peaks and precursor info for this scan instead of reading the MS2 file."""
+        spec = MSSpectrum()
+        spec.setMSLevel(2)
+        spec.set_peaks((np.asarray(mz, dtype=np.float64), np.asarray(intensity, dtype=np.float32)))
+        precursor = Precursor()
+        precursor.setMZ(precursor_mz)
+        precursor.setCharge(precursor_charge)
+        spec.setPrecursors([precursor])
+        self._spectrum = spec
+        self._scan_data = None
+        self.deisotoped_spectrum = None
+        self._compiled = None
+        self._exported = False
+
     def parse_dict(self) -> dict:
         """get dictionary: m/z is key, and intensity is value."""
-        return parse_data_from_MS2(self.ms2_file, self.s_number)[1]
+        return self.scan_data()[1]
+
+    def precursor(self) -> tuple:
+        """get (m/z, charge) of precursor, read from the spectrum without parsing the peaks; (0.0, 0) if it has none"""
+        precursors = self.scan_spectrum().getPrecursors()
+        if not precursors:
+            return 0.0, 0
+        return precursors[0].getMZ(), precursors[0].getCharge()
 
     def precursor_mz(self) -> float:
         """get m/z of precursor"""
-        return parse_data_from_MS2(self.ms2_file, self.s_number)[2]
+        return self.precursor()[0]
 
     def precursor_charge(self) -> int:
-        """get charge of precursor"""
-        return parse_data_from_MS2(self.ms2_file, self.s_number)[3]
+        """get charge of precursor (0 if unknown)"""
+        return self.precursor()[1]
 
-    def precursor_ms(self) -> float:
-        """Based on the m/z and charge of precursor, calculate the mass of precursor"""
+    def precursor_ms(self, charge: int = None) -> float:
+        """Based on the m/z and charge of precursor, calculate the neutral mass of precursor: M = (m/z - proton) * charge.
+           charge overrides the charge of the scan (e.g. when it is unknown).
+           root is the start of the y-ion ladder, the singly protonated mass [M+H]+."""
         m_z = self.precursor_mz()
-        charge = self.precursor_charge()
-        self.mass = m_z * charge
+        if charge is None:
+            charge = self.precursor_charge()
+        self.charge = charge
+        self.mass = (m_z - PROTON_MASS) * charge
+        self.root = self.mass + PROTON_MASS
         return self.mass
 
     def plot_spectrum(self, print_option: False) -> None:
         """ method used to generate spectrum plot of deisotoped spectrum"""
-        exp = MSExperiment()
-        MzMLFile().load(self.deisotoped_file, exp)
-        for spec in exp:
-            for mz, i in zip(*spec.get_peaks()):
-                plt.plot([mz, mz], [0, i], color = 'black')
-                plt.text(mz, i, str(mz))
-
-            # for the title add RT and Precursor m/z and charge info if available
-            title = ''
-            if spec.getRT() >= 0:
-                title += 'RT: ' + str(spec.getRT())
-            if len(spec.getPrecursors()) >= 1:
-                title += '   Precursor m/z: ' + str(spec.getPrecursors()[0].getMZ()) + '   Charge: '+ str(spec.getPrecursors()[0].getCharge())
-            plt.title(title)
-            plt.ylabel('intensity')
-            plt.xlabel('m/z')
-            plt.ylim(bottom=0)
-            plt.savefig(self.plot_file)
-
-            if print_option:
-                plt.show()
+        spec = self.deisotoped_scan()
+        for mz, i in zip(*spec.get_peaks()):
+            plt.plot([mz, mz], [0, i], color = 'black')
+            plt.text(mz, i, str(mz))
+
+        # for the title add RT and Precursor m/z and charge info if available
+        title = ''
+        if spec.getRT() >= 0:
+            title += 'RT: ' + str(spec.getRT())
+        if len(spec.getPrecursors()) >= 1:
+            title += '   Precursor m/z: ' + str(spec.getPrecursors()[0].getMZ()) + '   Charge: '+ str(spec.getPrecursors()[0].getCharge())
+        plt.title(title)
+        plt.ylabel('intensity')
+        plt.xlabel('m/z')
+        plt.ylim(bottom=0)
+        plt.savefig(self.plot_file)
+
+        if print_option:
+            plt.show()
 
     @staticmethod
     def parse_scan_data(specific_scan_MLfile: str) -> tuple:
@@ -120,16 +232,10 @@ class Peptide_identification(Spectrum_processing):
         self.aa_code = self.AA_code()
 
     def AA_code(self) -> dict:
-        """Amino Acid -> Mass dict"""
-        aa_code = {
-        'A': 71, 'C': 103, 'D': 115, 'E': 129, 'F': 147,
-        'G': 57, 'H': 137, 'I': 113, 'K': 128, 'L': 113,
-        'M': 131, 'N': 114, 'P': 97, 'Q': 128, 'R': 156,
-        'S': 87, 'T': 101, 'V': 99, 'W': 186, 'Y': 163,
-        }
-        self.aa = list(aa_code.keys())
-        self.aa_mass = list(aa_code.values())
-        return aa_code
+        """Amino Acid -> Mass dict (the shared, read-only table of the residues module)"""
+        self.aa = AA_LIST
+        self.aa_mass = AA_MASSES
+        return AA_CODE
 
     def identify_C_term(self, precursor_ms: float, dict_norm: dict, tolerance_error = 1) -> bool:
         """This function is used to get the C-terminal residue.(b-ion)
@@ -137,43 +243,35 @@ class Peptide_identification(Spectrum_processing):
         If it has R or K: return True,
         else: False
         """
-        mass_set = []
-        m_z = list(dict_norm.keys())
-        b_ion = []
-
-        for elem in m_z:
-            C_term_1 = int(precursor_ms - elem - 18)
-            C_term_2 = int(precursor_ms - elem - 18 - 17)
-            C_term_3 = int(precursor_ms - elem - 18 - 18)
-            if self.aa_code["R"] in range(C_term_1 - tolerance_error, C_term_1 + 1 + tolerance_error):
-                # only select the peaks with higher intensity as candidate
-                b_ion.append("R")
-                mass_set.append(elem)
-            elif self.aa_code["K"] in range(C_term_1 - tolerance_error, C_term_1 + 1 + tolerance_error):
-                b_ion.append("K")
-                mass_set.append(elem)
-            elif self.aa_code["R"] in range(C_term_2 - tolerance_error, C_term_2 + 1 + tolerance_error):
-                b_ion.append("R")
-                mass_set.append(elem)
-            elif self.aa_code["K"] in range(C_term_2 - tolerance_error, C_term_2 + 1 + tolerance_error):
-                b_ion.append("K")
-                mass_set.append(elem)
-            elif self.aa_code["R"] in range(C_term_3 - tolerance_error, C_term_3 + 1 + tolerance_error):
-                b_ion.append("R")
-                mass_set.append(elem)
-            elif self.aa_code["K"] in range(C_term_3 - tolerance_error, C_term_3 + 1 + tolerance_error):
-                b_ion.append("K")
-                mass_set.append(elem)
-
-        intensity_set = {elem: dict_norm[elem] for elem in mass_set}
+        peaks = PeakArray.coerce(dict_norm)
 
-        try:
-            ret = max(intensity_set, key = lambda x: intensity_set[x])
-
-            self.C_term_peak = [ret]
-            self.C_term_aa = [b_ion[mass_set.index(ret)]]
+        # b-ion of the C-terminal residue, allowing the loss of water/ammonia
+        if self.mass_tolerance is None:
+            c_term = [np.trunc(precursor_ms - peaks.mz - 18 - loss).astype(np.int64) for loss in (0, 17, 18)]
+            def matches(c, aa):
+                return (c - tolerance_error <= self.aa_code[aa]) & (self.aa_code[aa] <= c + tolerance_error)
+        else:
+            # b(n-1) = M - H2O - C-terminal residue + H+
+            c_term = [precursor_ms + PROTON_MASS - H2O_MASS - peaks.mz - loss for loss in (0, NH3_MASS, H2O_MASS)]
+            tol = self.tolerance(peaks.mz)
+            def matches(c, aa):
+                return np.abs(c - AA_MONO_MASS[aa]) <= tol
+        conditions = []
+        choices = []
+        for c in c_term:
+            for aa in ("R", "K"):
+                conditions.append(matches(c, aa))
+                choices.append(aa)
+        b_ion = np.select(conditions, choices, default="")
+        candidates = np.flatnonzero(b_ion != "")
+
+        if candidates.size > 0:
+            # select the peak with the highest intensity as candidate
+            best = candidates[np.argmax(peaks.intensity[candidates])]
+            self.C_term_peak = [peaks.mz[best]]
+            self.C_term_aa = [str(b_ion[best])]
             return True
-        except:
+        else:
             self.C_term_peak = None
             self.C_term_aa = None
             self.info_C = "cannot find b_ion at C terminal, no peptide generated here."
@@ -184,25 +282,70 @@ class Peptide_identification(Spectrum_processing):
         """ This function is used to if we can find candidate N terminal AA.
         If true: continue for the algorithm;
         else: return False"""
-        T_F_list = []
-        for elem in list(self.norm_dict.keys()):
-            mass_diff = int(self.mass) - int(elem)
-            if mass_diff in self.aa_mass:
-                T_F_list.append(True)
-        if True in T_F_list:
+        peaks = PeakArray.coerce(self.norm_dict)
+        if self.mass_tolerance is None:
+            found = is_aa_mass(int(self.root) - peaks.nominal).any()
+        else:
+            found = is_mono_aa_mass(self.root - peaks.mz, self.tolerance(self.root)).any()
+        if found:
             return True
         else:
             self.info_N = "cannot find y_ion at N terminal, no peptide generated here."
             return False
 
 
+    def count_ladder_peaks(self, peak_dict: dict) -> int:
+        """Estimate the ladder coverage: the number of peaks that differ from another peak by an amino acid mass.
+           Vectorised over the peaks, one binary search per amino acid mass."""
+        peaks = PeakArray.coerce(peak_dict)
+        if self.mass_tolerance is None:
+            nominal = np.unique(peaks.nominal[peaks.nominal >= 0])
+            if nominal.size == 0:
+                return 0
+            # bitmaps over nominal masses: peaks present, and peaks that are the lower end of a step
+            present = np.zeros(nominal[-1] + 1, dtype=bool)
+            present[nominal] = True
+            lower_end = np.zeros(nominal[-1] + 1, dtype=bool)
+            linked = np.zeros(nominal.size, dtype=bool)
+            for aa_mass in AA_MASS_SET:
+                lower = nominal - aa_mass
+                step = lower >= 0
+                step[step] = present[lower[step]]
+                linked |= step
+                lower_end[lower[step]] = True
+            return int((linked | lower_end[nominal]).sum())
+
+        mz = peaks.mz
+        tol = self.tolerance(mz)
+        linked = np.zeros(mz.size, dtype=bool)
+        for aa_mass in MONO_MASSES:
+            # first peak at or above mz - aa_mass - tol, a match if it is not above mz - aa_mass + tol
+            i = np.minimum(np.searchsorted(mz, mz - aa_mass - tol), mz.size - 1)
+            lower = mz[i] <= mz - aa_mass + tol
+            linked |= lower
+            linked[i[lower]] = True
+        return int(linked.sum())
+
+    def prefilter(self, peak_dict: dict, min_peaks = 10, min_ladder_peaks = 5) -> bool:
+        """Cheap checks run before any search: the number of peaks and the ladder coverage (count_ladder_peaks).
+           The C-/N-terminal evidence is checked next by identify_C_term and have_N_term, still before the search.
+           Return True if the scan may give a peptide, otherwise the reason is kept in failure_reason."""
+        if len(peak_dict) < min_peaks:
+            self.failure_reason = TOO_FEW_PEAKS
+            return False
+        if self.count_ladder_peaks(peak_dict) < min_ladder_peaks:
+            self.failure_reason = NO_LADDER
+            return False
+        return True
+
     def get_up_downstream_peak_dict(self, dict_norm: dict, min_AA = 57, max_AA = 187) -> dict:
         """
         DFS algorithm. search from N-terminal -> C terminal, largest m/z y-ion -> smallest
         Store up parent peak as key, and its corresponding child peak as list of values.
+        Every peak is expanded once, even if it is reached from several parent peaks.
         Parameters
         ----------
-        dict_norm: dict (m/z and normalized intensity)
+        dict_norm: dict or PeakArray (m/z and normalized intensity)
         min_AA: the minimum of AA (which is ued as the searching window)
         max_AA: the maximum of AA
 
@@ -210,31 +353,46 @@ class Peptide_identification(Spectrum_processing):
         -------
         route_dict: dict
         """
+        peaks = PeakArray.coerce(dict_norm)
+        nominal = peaks.nominal
 
         stack = []
-        stack.append(self.mass)
+        stack.append(self.root)
+        visited = set()
         self.route_dict = defaultdict(list)
         while len(stack) > 0:
             init = stack.pop()
-            searching_window = [elem for elem in list(dict_norm.keys()) if int(init)-max_AA < int(elem) < int(init)-min_AA]
-            for candidate_peak in searching_window:
-                mass_diff = int(init) - int(candidate_peak)
+            if init in visited:
+                # child peaks of this peak are already in route_dict
+                continue
+            visited.add(init)
+            if self.mass_tolerance is None:
+                # searching window: int(init)-max_AA <= int(peak) <= int(init)-min_AA
+                window = peaks.window(int(init) - max_AA, int(init) - min_AA)
                 # mass_difference matches to mass of AA
-                if mass_diff in self.aa_mass:
-                    # add down stream peaks here.
-                    self.route_dict[init].append(candidate_peak)
+                match = is_aa_mass(int(init) - nominal[window])
+            else:
+                tol = self.tolerance(init)
+                window = peaks.mz_window(init - max_AA - tol, init - min_AA + tol)
+                match = is_mono_aa_mass(init - peaks.mz[window], tol)
+            for candidate_peak in peaks.mz[window][match]:
+                # add down stream peaks here.
+                self.route_dict[init].append(candidate_peak)
+                if candidate_peak not in visited:
                     stack.append(candidate_peak)
 
         return self.route_dict
 
     def get_peak_pair(self) -> list:
-        """collection of all possible peak linkage."""
+        """collection of all possible peak linkage.
+        The pairs are read from the edges of route_dict between two parent peaks, in O(edges).
+        They keep the expansion order of route_dict (parent first, then child), which end_to_end_concate relies on."""
         # e.g. [[707.369183213676, 560.1217041015625], [560.1217041015625, 432.19842529296875], [560.1217041015625, 431.2114562988281]]
-        up_stream_peaks = self.route_dict.keys()
-        cc = list(itertools.combinations(up_stream_peaks, 2))
+        order = {peak: i for i, peak in enumerate(self.route_dict) if self.route_dict[peak]}
         self.pair_list = []
-        for x, y in cc:
-            if int(x) - int(y) in self.aa_mass:
+        for x, i in order.items():
+            children = [y for y in self.route_dict[x] if order.get(y, -1) > i]
+            for y in sorted(children, key=order.get):
                 self.pair_list.append([x, y])
         return self.pair_list
 
@@ -278,26 +436,88 @@ class Peptide_identification(Spectrum_processing):
             self.merge_info = "Not enough AA generated, NO peptide sequence."
             return False
 
+    def get_best_paths(self, top_k = 100, peptide_identification_tolerance = 1):
+        """Spectrum graph search replacing get_peak_pair/end_to_end_concate/get_peak_list.
+           Dynamic programming over route_dict keeps the top_k highest scoring peak paths
+           from the precursor that match the precursor mass, so memory is bounded by top_k
+           and not by the number of paths."""
+        graph = SpectrumGraph(self.route_dict, self.root)
+        self.graph_size = (len(graph.nodes), graph.n_edges)
+        self.stats.count("graph_nodes", len(graph.nodes))
+        self.stats.count("graph_edges", graph.n_edges)
+        paths = graph.best_paths(lambda peak: self.norm_dict[peak], top_k,
+                                 accept=lambda peak: self.match_precursor(peak, peptide_identification_tolerance))
+        self.new_list = [path for score, path in paths]
+        if not self.new_list:
+            self.merge_info = "Not enough AA generated, NO peptide sequence."
+            return False
+        return self.new_list
+
+    def get_beam_paths(self, beam_width = 10, top_k = 100, peptide_identification_tolerance = 1):
+        """Beam search alternative to get_up_downstream_peak_dict + get_best_paths.
+           Only the beam_width best partial sequences of every prefix mass are extended at every step,
+           and partial sequences that cannot reach the precursor mass any more are dropped."""
+        if self.mass_tolerance is None:
+            center = int(self.root) + AA_CODE[self.C_term_aa[0]] + 18 - self.mass
+            end_masses = [x for x in range(int(center - peptide_identification_tolerance) - 1,
+                                           int(center + peptide_identification_tolerance) + 2)
+                          if self.match_precursor(x, peptide_identification_tolerance)]
+            tolerance = None
+        else:
+            end_masses = [self.y1_mass()]
+            tolerance = self.tolerance
+        paths = beam_search(PeakArray.coerce(self.norm_dict), self.root, end_masses, beam_width, top_k,
+                            tolerance=tolerance)
+        self.new_list = [path for score, path in paths]
+        if not self.new_list:
+            self.merge_info = "Not enough AA generated, NO peptide sequence."
+            return False
+        return self.new_list
+
+    def y1_mass(self) -> float:
+        """m/z of the singly charged y1 ion (the C-terminal residue), where a ladder ends in the high-accuracy mode."""
+        return AA_MONO_MASS[self.C_term_aa[0]] + H2O_MASS + PROTON_MASS
+
+    def match_precursor(self, last_peak: float, peptide_identification_tolerance = 1) -> bool:
+        """Whether a peak path from the precursor to last_peak plus the C-terminal AA matches the precursor mass.
+           In the high-accuracy mode last_peak must be the y1 ion within the mass tolerance."""
+        if self.mass_tolerance is not None:
+            return bool(abs(last_peak - self.y1_mass()) <= self.tolerance(last_peak))
+        # the ladder from [M+H]+ to last_peak, the C-terminal AA and water
+        total_mass = int(self.root) - int(last_peak) + AA_CODE[self.C_term_aa[0]] + 18
+        return abs(total_mass - self.mass) < peptide_identification_tolerance
+
     def get_peptide_list(self, peptide_identification_tolerance = 1) -> list:
         """From the peak list to generate corresponding peptide lists.
            Here we should add the missing C terminal AA."""
         mass_list = []
         seq_list = []
+        accurate = self.mass_tolerance is not None
 
         for elem in self.new_list:
             total_mass = 0
             seq = ""
             for i in range(0, len(elem) - 1):
-                mass_difference = int(elem[i]) - int(elem[i + 1])
-                seq += self.aa[self.aa_mass.index(mass_difference)]
-                total_mass += mass_difference
+                if accurate:
+                    aa = aa_of_mono_mass(elem[i] - elem[i + 1], self.tolerance(elem[i]))
+                    seq += aa
+                    total_mass += AA_MONO_MASS[aa]
+                else:
+                    mass_difference = int(elem[i]) - int(elem[i + 1])
+                    seq += aa_of_mass(mass_difference)
+                    total_mass += mass_difference
 
             # Add corresponding C-terminal AA
-            total_mass += self.AA_code()[self.C_term_aa[0]]
+            if accurate:
+                total_mass += AA_MONO_MASS[self.C_term_aa[0]] + H2O_MASS
+            else:
+                total_mass += AA_CODE[self.C_term_aa[0]] + 18
             seq += self.C_term_aa[0]
             mass_list.append(total_mass)
             seq_list.append(seq)
 
+        if accurate:
+            peptide_identification_tolerance = self.tolerance(self.mass)
         self.filter_seq = []
         self.filter_peak = []
         for i, elem in enumerate(mass_list):
@@ -310,25 +530,153 @@ class Peptide_identification(Spectrum_processing):
         combine_info = [self.filter_seq, self.filter_peak, self.filter_peak_intensity]
         return combine_info
 
-    def compile(self, show_C_terminal: False):
-        """This is a compile version of getting final peptide list."""
-        self.AA_code()
-        self.store_one_scan_and_get_deisotoped()
-        dict_p = self.parse_scan_data(self.raw_file)[1]
-        self.normalization(dict_p)
-        self.precursor_ms()
+    def compile(self, show_C_terminal: False, export_files = False, top_k = 100, algorithm = "graph", beam_width = 10,
+                mass_tolerance = None, tolerance_unit = "ppm", charge_range = None, min_peaks = 10, min_ladder_peaks = 5,
+                preprocess = None, use_deisotoped = True):
+        """This is a compile version of getting final peptide list.
+           The scan is processed in memory; export_files also stores the raw and deisotoped scan as .ML files.
+           top_k is the maximal number of peak paths returned.
+           algorithm is "graph" (spectrum graph search over all peaks) or "beam" (beam search with beam_width).
+           mass_tolerance switches from nominal masses to monoisotopic masses matched within mass_tolerance
+           (tolerance_unit "ppm" or "Da"), for high-resolution data.
+           A scan of unknown charge is skipped, unless charge_range (lowest, highest) gives the charges to try.
+           use_deisotoped searches the deisotoped, charge-collapsed peaks (search_peaks) instead of the raw peaks.
+           Scans with fewer than min_peaks peaks or min_ladder_peaks ladder peaks are rejected (see prefilter).
+           preprocess holds the keyword arguments of preprocess.preprocess_peaks (top-N per window,
+           intensity threshold, precursor removal), None to keep every peak.
+           The wall time of every stage and the counters are kept in self.stats.
+           The result is memoised: calling compile again with the same parameters returns the same result
+           without searching again (call invalidate() to force a new search)."""
+        key = (top_k, algorithm, beam_width, mass_tolerance, tolerance_unit, charge_range, min_peaks,
+               min_ladder_peaks, preprocess, use_deisotoped)
+        if self._compiled is not None and self._compiled[0] == key and (self._exported or not export_files):
+            return self._compiled[1]
+        self.stats = ScanStats(self.s_number)
+        with self.stats.stage("load"):
+            self.scan_spectrum()
+        result = self.identify_peaks(None, show_C_terminal, top_k, algorithm, beam_width,
+                                     mass_tolerance, tolerance_unit, charge_range, min_peaks, min_ladder_peaks,
+                                     preprocess, use_deisotoped)
+        if export_files:
+            with self.stats.stage("export"):
+                self.store_one_scan_and_get_deisotoped()
+        elif not use_deisotoped and not self.rejected:
+            # the deisotoped scan size of the peptide table, a scan rejected before the search is not deisotoped
+            with self.stats.stage("deisotope"):
+                self.deisotoped_scan()
+        self._exported = self._exported or export_files
+        self._compiled = (key, result)
+        return result
+
+    def invalidate(self) -> None:
+        """Forget the memoised result of compile."""
+        self._compiled = None
+
+    def identify_peaks(self, peak_dict: dict = None, show_C_terminal = False, top_k = 100, algorithm = "graph",
+                       beam_width = 10, mass_tolerance = None, tolerance_unit = "ppm", charge_range = None,
+                       min_peaks = 10, min_ladder_peaks = 5, preprocess = None, use_deisotoped = True):
+        """Get the final peptide list from the peaks (PeakArray or m/z -> intensity dict) of this scan,
+           without reading or writing files. Without peaks, the search_peaks(use_deisotoped) of the scan are used,
+           deisotoped only if the scan is not rejected by its charge or its raw number of peaks (min_peaks).
+           The peaks are preprocessed (preprocess) before the spectrum graph is built.
+           If the precursor charge is unknown (0), every charge of charge_range (lowest, highest) is tried
+           and the one giving the best scoring peptide is kept; without charge_range the scan is skipped.
+           Returns None if no peptide is found, the reason is kept in failure_reason;
+           rejected tells whether the scan was given up before the search."""
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm '{algorithm}', use one of {ALGORITHMS}")
+        self.set_mass_tolerance(mass_tolerance, tolerance_unit)
+        # the attributes of the search change, so a memoised compile result is stale
+        self._compiled = None
+        self.failure_reason = None
+        self.rejected = True
+        charge = self.precursor_charge()
+        if charge > 0:
+            charges = [charge]
+        elif charge_range:
+            charges = list(range(charge_range[0], charge_range[1] + 1))
+        else:
+            # nothing can match a precursor of unknown mass, do not run the search
+            self.failure_reason = UNKNOWN_CHARGE
+            return None
+
+        stats = self.stats
+        if peak_dict is None:
+            stats.count("peaks_in", self.scan_spectrum().size())
+            # deisotoping never adds peaks, so a scan with too few raw peaks is rejected before it
+            if self.scan_spectrum().size() < min_peaks:
+                self.failure_reason = TOO_FEW_PEAKS
+                return None
+            peak_dict = self.search_peaks(use_deisotoped)
+        else:
+            stats.count("peaks_in", len(peak_dict))
+        if preprocess:
+            with stats.stage("preprocess"):
+                peak_dict = preprocess_peaks(peak_dict, self.precursor_mz(), charge, **preprocess)
+            stats.count("peaks_preprocessed", len(peak_dict))
+        with stats.stage("prefilter"):
+            passed = self.prefilter(peak_dict, min_peaks, min_ladder_peaks)
+        if not passed:
+            return None
+        with stats.stage("normalization"):
+            self.normalization(peak_dict)
+        if len(charges) == 1:
+            return self.identify_charge(charges[0], show_C_terminal, top_k, algorithm, beam_width)
+
+        stats.count("charges", len(charges))
+        best = None
+        rejected = True
+        for charge in charges:
+            result = self.identify_charge(charge, show_C_terminal, top_k, algorithm, beam_width)
+            rejected = rejected and self.rejected
+            if result and result[2] and (best is None or max(result[2]) > best[0]):
+                # the attributes of this instance are overwritten by the next charge, keep those of the best one
+                # (the search builds new lists and dicts for every charge, so a shallow copy is enough)
+                best = (max(result[2]), result, dict(vars(self)))
+        if best is None:
+            self.rejected = rejected
+            return None
+        vars(self).update(best[2])
+        return best[1]
+
+    def identify_charge(self, charge: int, show_C_terminal = False, top_k = 100, algorithm = "graph", beam_width = 10):
+        """Get the peptide list of the normalized peaks (norm_dict) for one precursor charge."""
+        stats = self.stats
+        self.failure_reason = None
+        self.rejected = True
+        self.precursor_ms(charge)
 
         # If N- and C- terminal were identified, we can continue the algorithm...
-        if self.identify_C_term(self.mass, self.norm_dict):
-            if self.have_N_term():
+        with stats.stage("C_term"):
+            has_C_term = self.identify_C_term(self.mass, self.norm_dict)
+        if has_C_term:
+            with stats.stage("N_term"):
+                has_N_term = self.have_N_term()
+            if has_N_term:
                 # here we can see C terminal (whether R or k)
                 if show_C_terminal:
                     print(f"The C_terminal is:{self.C_term_aa, self.C_term_peak}")
-                self.get_up_downstream_peak_dict(self.norm_dict)
-                self.get_peak_pair()
-                merge_list = self.end_to_end_concate(self.pair_list)
-                if self.get_peak_list(merge_list):
-                    return self.get_peptide_list()
+                self.rejected = False
+                if algorithm == "beam":
+                    with stats.stage("beam_search"):
+                        found = self.get_beam_paths(beam_width, top_k)
+                else:
+                    with stats.stage("dfs"):
+                        self.get_up_downstream_peak_dict(self.norm_dict)
+                    with stats.stage("graph_search"):
+                        found = self.get_best_paths(top_k)
+                stats.count("paths", len(self.new_list))
+                if found:
+                    with stats.stage("peptides"):
+                        result = self.get_peptide_list()
+                    # candidates passing the precursor mass filter
+                    stats.count("peptides", len(self.filter_seq))
+                    return result
+                self.failure_reason = self.merge_info
+            else:
+                self.failure_reason = self.info_N
+        else:
+            self.failure_reason = self.info_C
 
     @staticmethod
     def peptide_info(peptide: str):
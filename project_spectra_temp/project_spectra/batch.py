@@ -0,0 +1,198 @@
+"""This module is used to run de novo sequencing over many scans of one MS2 file.
+   The peptides of all scans are streamed into one output table.
+"""
+
+import logging
+import multiprocessing
+import os
+from collections import Counter
+from functools import partial
+from time import perf_counter
+from typing import NamedTuple
+from project_spectra.Parse_data_MS2 import get_ms2_scan_numbers, get_spectrum
+from project_spectra.Spec_peptide import Peptide_identification
+from project_spectra.export import RESULT_COLUMNS, open_result_writer
+from project_spectra.stats import ScanStats
+
+
+def select_scans(ms2_file: str, first: int = None, last: int = None) -> list:
+    """
+    Get the MS2 scan numbers to sequence.
+    Parameters
+    ----------
+    ms2_file: str
+            The MS2 .mzML file
+    first: int
+            The first scan number (inclusive), None to start at the first MS2 scan
+    last: int
+            The last scan number (inclusive), None to stop at the last MS2 scan
+    Returns
+    -------
+    list of scan numbers
+    """
+    scans = get_ms2_scan_numbers(ms2_file)
+    if first is not None:
+        scans = [x for x in scans if x >= first]
+    if last is not None:
+        scans = [x for x in scans if x <= last]
+    return scans
+
+
+def read_scan_peaks(ms2_file: str, scans: list):
+    """
+    Yield compact (scan, m/z array, intensity array, precursor m/z, precursor charge, load time) tuples.
+    The tuples hold only NumPy arrays and numbers, so they are cheap to send to worker processes.
+    """
+    for scan in scans:
+        start = perf_counter()
+        spec = get_spectrum(ms2_file, scan)
+        mz, intensity = spec.get_peaks()
+        precursors = spec.getPrecursors()
+        pre_mz = precursors[0].getMZ() if precursors else 0.0
+        pre_charge = precursors[0].getCharge() if precursors else 0
+        yield scan, mz, intensity, pre_mz, pre_charge, perf_counter() - start
+
+
+class IdentificationResult(NamedTuple):
+    """Peptides of one scan. sequences, peaks and scores are parallel lists,
+       failure_reason tells why they are empty, stats holds the stage timings and counters."""
+    scan: int
+    precursor_mz: float
+    charge: int
+    sequences: list
+    peaks: list
+    scores: list
+    failure_reason: str = None
+    stats: ScanStats = None
+
+
+def sequence_scan_peaks(task: tuple, options: dict = None) -> IdentificationResult:
+    """
+    Sequence one scan from the compact tuple of read_scan_peaks.
+    options are keyword arguments of Peptide_identification.identify_peaks (e.g. algorithm, beam_width);
+    like compile, the deisotoped peaks are searched unless use_deisotoped is False.
+    """
+    scan, mz, intensity, pre_mz, pre_charge, load_time = task
+    p = Peptide_identification(None, scan)
+    p.stats.add_time("load", load_time)
+    with p.stats.stage("load"):
+        p.set_peaks(mz, intensity, pre_mz, pre_charge)
+    try:
+        result = p.identify_peaks(**(options or {}))
+    except Exception as e:
+        logging.warning('Scan {} could not be sequenced: {}'.format(scan, e))
+        return IdentificationResult(scan, pre_mz, pre_charge, [], [], [], f"error: {e}", p.stats)
+    if not result:
+        return IdentificationResult(scan, pre_mz, pre_charge, [], [], [], p.failure_reason, p.stats)
+
+    seq, peaks, scores = result
+    # a scan of unknown charge (0) is sequenced at the best charge of charge_range
+    return IdentificationResult(scan, pre_mz, p.charge, list(seq),
+                                [[float(x) for x in path] for path in peaks],
+                                [float(x) for x in scores], stats=p.stats)
+
+
+def iter_identifications(ms2_file: str, scans: list = None, workers: int = 1, chunksize: int = 8,
+                         options: dict = None):
+    """
+    Sequence scans of an MS2 file and yield one IdentificationResult per scan as it completes, in scan order.
+    Only the scans being processed are held in memory, so the caller can write results or stop at any time.
+    Parameters
+    ----------
+    ms2_file: str
+            The MS2 .mzML file
+    scans: list
+            Scan numbers to sequence, None for all MS2 scans
+    workers: int
+            Number of worker processes; 1 runs in this process, 0 uses all CPU cores
+    chunksize: int
+            Number of scans sent to a worker at once
+    options: dict
+            Keyword arguments of Peptide_identification.identify_peaks
+    """
+    if scans is None:
+        scans = select_scans(ms2_file)
+    tasks = read_scan_peaks(ms2_file, scans)
+    sequence = partial(sequence_scan_peaks, options=options)
+    if workers == 1:
+        yield from map(sequence, tasks)
+        return
+
+    with multiprocessing.Pool(workers or os.cpu_count()) as pool:
+        # imap keeps the results in scan order while workers run ahead.
+        yield from pool.imap(sequence, tasks, chunksize)
+
+
+def iter_peptide_rows(ms2_file: str, scans: list, workers: int = 1, chunksize: int = 8, options: dict = None,
+                      on_result=None):
+    """
+    Sequence every scan and yield one de-duplicated row per peptide, in scan order.
+    Scans without any peptide yield no row. The parameters are those of iter_identifications,
+    on_result is called with the IdentificationResult of every scan (e.g. to collect its stats).
+    """
+    for result in iter_identifications(ms2_file, scans, workers, chunksize, options):
+        if on_result is not None:
+            on_result(result)
+        seen = set()
+        for seq, peaks, score in zip(result.sequences, result.peaks, result.scores):
+            key = (seq, tuple(peaks))
+            if key in seen:
+                continue
+            seen.add(key)
+            yield [result.scan, result.precursor_mz, result.charge, seq, peaks, score]
+
+
+def denovo_batch(ms2_file: str, output_file: str, scans: list = None, workers: int = 1, options: dict = None,
+                 fmt: str = None, stats_file: str = None) -> dict:
+    """
+    Sequence a list of scans and write the peptides of all scans into one table.
+    Rows are written as soon as a scan is sequenced (in row groups for Parquet/Arrow).
+    Parameters
+    ----------
+    ms2_file: str
+            The MS2 .mzML file
+    output_file: str
+            The output table: .csv, .parquet, .arrow, tab separated otherwise
+    scans: list
+            Scan numbers to sequence, None for all MS2 scans
+    workers: int
+            Number of worker processes; 1 runs in this process, 0 uses all CPU cores
+    options: dict
+            Keyword arguments of Peptide_identification.identify_peaks
+    fmt: str
+            One of export.RESULT_FORMATS, None to choose it from the extension of output_file
+    stats_file: str
+            If given, the stage timings and counters of every scan are written to it as JSON lines
+    Returns
+    -------
+    dict: number of scans processed, scans with peptides, peptide rows written,
+          the number of scans without peptides per failure reason
+          and the stats summed over all scans (ScanStats)
+    """
+    if scans is None:
+        scans = select_scans(ms2_file)
+
+    total = ScanStats()
+    failures = Counter()
+    stats_out = open(stats_file, "w") if stats_file else None
+
+    def collect(result):
+        total.add(result.stats)
+        if result.failure_reason:
+            failures[result.failure_reason] += 1
+        if stats_out:
+            stats_out.write(result.stats.to_json() + "\n")
+
+    identified = set()
+    n_rows = 0
+    try:
+        with open_result_writer(output_file, fmt) as writer:
+            for row in iter_peptide_rows(ms2_file, scans, workers, options=options, on_result=collect):
+                writer.write_row(row)
+                identified.add(row[0])
+                n_rows += 1
+    finally:
+        if stats_out:
+            stats_out.close()
+    return {"scans": len(scans), "identified_scans": len(identified), "rows": n_rows,
+            "failures": dict(failures), "stats": total}
@@ -0,0 +1,73 @@
+"""This module is used for beam search de novo sequencing of one scan.
+   Instead of building the whole spectrum graph, partial sequences are extended step by step from the precursor
+   and only the best ones (by summed peak intensity) are kept for every prefix mass, so the time per scan
+   is bounded by the beam width and the number of peaks.
+"""
+
+from collections import defaultdict
+from operator import itemgetter
+import heapq
+import numpy as np
+from project_spectra.peaks import PeakArray
+from project_spectra.residues import is_aa_mass, is_mono_aa_mass
+
+
+def beam_search(peaks: PeakArray, source: float, end_masses: list, beam_width = 10, top_k = 100,
+                min_AA = 57, max_AA = 187, tolerance = None) -> list:
+    """
+    Beam search from the precursor down to the peaks where a peptide may end.
+    Parameters
+    ----------
+    peaks: PeakArray (m/z and normalized intensity)
+    source: the start mass (precursor mass)
+    end_masses: masses of the peaks where a sequence matches the precursor mass (nominal if tolerance is None)
+    beam_width: number of partial sequences kept per prefix mass (the nominal mass of their last peak)
+            after every extension step
+    top_k: number of complete sequences returned
+    min_AA: the minimum of AA (which is ued as the searching window)
+    max_AA: the maximum of AA
+    tolerance: None for nominal masses, or a callable m/z -> tolerance (Da) to match monoisotopic masses
+
+    Returns
+    -------
+    list of (score, path) with the highest score first, path as list of peaks starting at the source
+    """
+    accurate = tolerance is not None
+    ends = np.asarray(sorted(end_masses), dtype=np.float64 if accurate else np.int64)
+    if ends.size == 0:
+        return []
+    nominal = peaks.nominal
+    masses = peaks.mz if accurate else nominal
+
+    beam = [(0.0, [source])]
+    complete = []
+    while beam:
+        # partial sequences by prefix mass
+        candidates = defaultdict(list)
+        for score, path in beam:
+            if accurate:
+                init = path[-1]
+                tol = tolerance(init)
+                window = peaks.mz_window(init - max_AA - tol, init - min_AA + tol)
+                index = np.arange(window.start, window.stop)[is_mono_aa_mass(init - peaks.mz[window], tol)]
+            else:
+                init = int(path[-1])
+                tol = 0
+                window = peaks.window(init - max_AA, init - min_AA)
+                index = np.arange(window.start, window.stop)[is_aa_mass(init - nominal[window])]
+            # remaining mass to any end peak must be zero or at least one amino acid
+            remaining = masses[index][:, None] - ends[None, :]
+            if accurate:
+                at_end = np.any(np.abs(remaining) <= np.broadcast_to(tolerance(masses[index]), index.shape)[:, None], axis=1)
+            else:
+                at_end = np.any(remaining == 0, axis=1)
+            viable = at_end | np.any(remaining >= min_AA - tol, axis=1)
+            for i, end in zip(index[viable], at_end[viable]):
+                new = (score + float(peaks.intensity[i]), path + [peaks.mz[i]])
+                if end:
+                    complete.append(new)
+                candidates[nominal[i]].append(new)
+        # the best partial sequences of every prefix mass, so a few intense peaks do not crowd out the others
+        beam = [x for bucket in candidates.values() for x in heapq.nlargest(beam_width, bucket, key=itemgetter(0))]
+
+    return heapq.nlargest(top_k, complete, key=itemgetter(0))
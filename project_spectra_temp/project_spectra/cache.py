@@ -0,0 +1,189 @@
+"""This module is used to cache the identification result of one scan on disk.
+   An entry is addressed by the content hash of the MS2 file, the scan number, the search parameters
+   and the package version, so a changed file, parameter or release never returns a stale result.
+   The cache lives under ~/.projectSpectra/cache and drops the least recently used entries above max_bytes.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+
+from project_spectra import __version__
+from project_spectra.stats import ScanStats
+
+CACHE_DIR = Path(Path.home(), ".projectSpectra", "cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# compile() arguments that do not change the result
+_NOT_KEYED = ("show_C_terminal", "export_files")
+_FILE_INDEX = "files.json"
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the file content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def known_file_digest(path: str, index_file: Path) -> str:
+    """
+    SHA-256 of the file content, remembered in index_file (JSON: path -> size, mtime, hash)
+    and only recomputed when the size or modification time of the file change.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    try:
+        index = json.loads(Path(index_file).read_text())
+    except (OSError, ValueError):
+        index = {}
+    known = index.get(path)
+    if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return known["sha256"]
+    digest = file_digest(path)
+    index[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    write_atomic(Path(index_file), json.dumps(index).encode())
+    return digest
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write through a temporary file, so a reader never sees a partial file.
+       Every write has its own temporary file, so concurrent writers (threads of the web app) do not collide."""
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False) as f:
+        f.write(data)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+def params_key(params: dict) -> str:
+    """Hash of the search parameters and the package version."""
+    params = {name: value for name, value in params.items() if name not in _NOT_KEYED}
+    text = json.dumps({"params": params, "version": __version__}, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of per-scan results: <directory>/<file hash>/<scan>-<params key>.pkl
+    Parameters
+    ----------
+    directory: str
+            Cache folder, default ~/.projectSpectra/cache (or the SPECTRA_CACHE_DIR environment variable)
+    max_bytes: int
+            Size limit of the cache, the least recently used entries are removed above it
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory or os.environ.get("SPECTRA_CACHE_DIR", CACHE_DIR))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def file_hash(self, ms2_file: str) -> str:
+        """Content hash of the MS2 file, only recomputed when its size or modification time change."""
+        return known_file_digest(ms2_file, self.directory / _FILE_INDEX)
+
+    def entry_path(self, ms2_file: str, scan: int, params: dict) -> Path:
+        return self.directory / self.file_hash(ms2_file) / f"{int(scan)}-{params_key(params)}.pkl"
+
+    def get(self, ms2_file: str, scan: int, params: dict, default=None):
+        """The cached value, or default if there is none (a cached None is returned as None)."""
+        path = self.entry_path(ms2_file, scan, params)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return default
+        # the modification time marks the last use, for the LRU eviction
+        os.utime(path)
+        return value
+
+    def put(self, ms2_file: str, scan: int, params: dict, value) -> None:
+        path = self.entry_path(ms2_file, scan, params)
+        path.parent.mkdir(exist_ok=True)
+        write_atomic(path, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+
+    def entries(self) -> list:
+        """(path, size, last use) of every entry."""
+        result = []
+        for folder in self.directory.iterdir():
+            if folder.is_dir():
+                for entry in os.scandir(folder):
+                    if entry.name.endswith(".pkl"):
+                        stat = entry.stat()
+                        result.append((Path(entry.path), stat.st_size, stat.st_mtime))
+        return result
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> int:
+        """Remove the least recently used entries until the cache fits max_bytes, returns the number removed."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in sorted(entries, key=lambda x: x[2]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, ms2_file: str = None, scan: int = None) -> None:
+        """Remove the entries of one scan, of one file (scan None) or every entry (ms2_file None)."""
+        if ms2_file is None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            return
+        folder = self.directory / self.file_hash(ms2_file)
+        if scan is None:
+            shutil.rmtree(folder, ignore_errors=True)
+        elif folder.is_dir():
+            for path in folder.glob(f"{int(scan)}-*.pkl"):
+                path.unlink(missing_ok=True)
+
+
+_MISSING = object()
+
+
+def cached_compile(p, cache: ResultCache = None, **options):
+    """
+    Peptide_identification.compile(**options) through the result cache.
+    Parameters
+    ----------
+    p: Peptide_identification
+            The scan to sequence
+    cache: ResultCache
+            The cache, None to always compile
+    options:
+            Keyword arguments of compile; export_files always compiles (the files are written by compile)
+    Returns
+    -------
+    The result of compile, p.failure_reason is set as well
+    """
+    if cache is None or options.get("export_files"):
+        return p.compile(**options)
+    # key on every parameter with its default filled in, so a changed default gets other entries
+    params = inspect.signature(p.compile).bind(**options)
+    params.apply_defaults()
+    params = params.arguments
+    p.stats = ScanStats(p.s_number)
+    with p.stats.stage("cache"):
+        cached = cache.get(p.ms2_file, p.s_number, params, _MISSING)
+    if cached is not _MISSING:
+        result, p.failure_reason = cached
+        return result
+    result = p.compile(**options)
+    cache.put(p.ms2_file, p.s_number, params, (result, p.failure_reason))
+    return result
@@ -3,9 +3,24 @@
 
 import click
 from pyopenms import *
-from project_spectra.Parse_data_MS2 import get_ms2, parse_data_from_MS2
-from project_spectra.Spec_peptide import Peptide_identification
+from project_spectra.Parse_data_MS2 import get_ms2, get_scan_count, parse_data_from_MS2
+from project_spectra.Spec_peptide import ALGORITHMS, Peptide_identification
 from project_spectra.identifier import Identifier
+from project_spectra.batch import denovo_batch, select_scans
+from project_spectra.export import RESULT_FORMATS
+from project_spectra.residues import TOLERANCE_UNITS
+from project_spectra.preprocess import parse_preprocess_options
+from project_spectra.cache import ResultCache, cached_compile
+from project_spectra.protein_index import ProteinIndex, open_index
+from project_spectra.protein_match import LocalBackend, make_stand_in_server, stand_in_url
+
+
+def preprocess_option(ctx, param, value):
+	"""Parse the --preprocess option into the keyword arguments of preprocess_peaks."""
+	try:
+		return parse_preprocess_options(value)
+	except ValueError as e:
+		raise click.BadParameter(str(e))
 
 
 @click.group(help = f'The Command Line Utilities of generating peptides and candidate proteins.')
@@ -30,9 +45,7 @@ def ms2_cli(input_path: str, output_path: str) -> None:
 def check_scan_size(input_path: str) -> int:
 
 	"""Get the total scan number of MS2 file."""
-	exp = MSExperiment()
-	MzMLFile().load(input_path, exp)
-	size = len(exp.getSpectra())
+	size = get_scan_count(input_path)
 	print(size)
 
 
@@ -63,7 +76,6 @@ def get_plot_spectrum(ms2_raw: str, scan_number: int, verbose: bool):
 
 	"""Generate Plot of de-isotoped spectrum of one MS2 scan."""
 	p = Peptide_identification(ms2_raw, int(scan_number))
-	p.store_one_scan_and_get_deisotoped()
 	p.plot_spectrum(print_option = verbose)
 
 
@@ -71,14 +83,13 @@ def get_plot_spectrum(ms2_raw: str, scan_number: int, verbose: bool):
 @main.command(name = 'check_C')
 @click.argument('ms2_raw')
 @click.argument('scan_number')
-def identify_C_terminal(ms2_raw: str, scan_number: int) -> bool:
+@click.option('--deisotoped/--raw-peaks', 'use_deisotoped', default=True, help="Check the deisotoped, charge-collapsed peaks (as searched by peptide_list) or the raw peaks. Default: deisotoped.")
+def identify_C_terminal(ms2_raw: str, scan_number: int, use_deisotoped: bool) -> bool:
 
 	"""check C terminal (b-ion) R or K is identified or not."""
 	p = Peptide_identification(ms2_raw, int(scan_number))
 	p.AA_code()
-	p.store_one_scan_and_get_deisotoped()
-	dict_p = p.parse_scan_data(p.raw_file)[1]
-	p.normalization(dict_p)
+	p.normalization(p.search_peaks(use_deisotoped))
 	p.precursor_ms()
 	print("Can we identify b-ion at C-terminal with R or K....?")
 	print(p.identify_C_term(p.mass, p.norm_dict))
@@ -88,14 +99,13 @@ def identify_C_terminal(ms2_raw: str, scan_number: int) -> bool:
 @main.command(name = 'check_N')
 @click.argument('ms2_raw')
 @click.argument('scan_number')
-def identify_N_terminal(ms2_raw: str, scan_number: int) -> bool:
+@click.option('--deisotoped/--raw-peaks', 'use_deisotoped', default=True, help="Check the deisotoped, charge-collapsed peaks (as searched by peptide_list) or the raw peaks. Default: deisotoped.")
+def identify_N_terminal(ms2_raw: str, scan_number: int, use_deisotoped: bool) -> bool:
 
 	"""check N terminal (y-ion) is identified or not."""
 	p = Peptide_identification(ms2_raw, int(scan_number))
 	p.AA_code()
-	p.store_one_scan_and_get_deisotoped()
-	dict_p = p.parse_scan_data(p.raw_file)[1]
-	p.normalization(dict_p)
+	p.normalization(p.search_peaks(use_deisotoped))
 	p.precursor_ms()
 	print("Can we identify the first y-ion at N-terminal using our algorithm....?")
 	print(p.have_N_term())
@@ -106,21 +116,35 @@ def identify_N_terminal(ms2_raw: str, scan_number: int) -> bool:
 @click.argument('ms2_raw')
 @click.argument('scan_number')
 @click.option('-v', '--verbose', default=False, is_flag=True, help="When used, will print the C_terminal to STDOUT.")
-def get_peptide(ms2_raw: str, scan_number: int, verbose:bool) -> list:
+@click.option('--export', default=False, is_flag=True, help="When used, will also store the raw and de-isotoped scan as .mzML files.")
+@click.option('-a', '--algorithm', default="graph", type=click.Choice(ALGORITHMS), help="Spectrum graph search or beam search. Default: graph.")
+@click.option('-b', '--beam-width', default=10, type=int, help="Partial sequences kept per prefix mass and step by the beam search. Default: 10.")
+@click.option('--stats', default=False, is_flag=True, help="When used, will print the wall time of every stage and the counters as JSON.")
+@click.option('-t', '--tolerance', default=None, type=float, help="Match monoisotopic masses within this tolerance (high-resolution data). Default: nominal masses.")
+@click.option('--tolerance-unit', default="ppm", type=click.Choice(TOLERANCE_UNITS), help="Unit of --tolerance. Default: ppm.")
+@click.option('--charge-range', default=None, type=(int, int), help="Lowest and highest charge tried when the precursor charge is unknown. Default: skip such scans.")
+@click.option('-p', '--preprocess', default=None, callback=preprocess_option, help="Peak preprocessing before the search, e.g. 'top_n=10,window=100,min_intensity=1,precursor_tolerance=2'. Default: keep every peak.")
+@click.option('--deisotoped/--raw-peaks', 'use_deisotoped', default=True, help="Search the deisotoped, charge-collapsed peaks or the raw peaks. Default: deisotoped.")
+@click.option('--no-cache', default=False, is_flag=True, help="When used, will sequence the scan again instead of reading the result cache (~/.projectSpectra/cache).")
+def get_peptide(ms2_raw: str, scan_number: int, verbose:bool, export:bool, algorithm:str, beam_width:int, stats:bool, tolerance:float, tolerance_unit:str, charge_range:tuple, preprocess:dict, use_deisotoped:bool, no_cache:bool) -> list:
 
 	"""get peptide seq list from one scan and the detailed info about the peptide seq"""
 	import pandas as pd
 
 	p = Peptide_identification(ms2_raw, int(scan_number))
+	cache = None if no_cache else ResultCache()
 	try:
-		list_peptide = p.compile(show_C_terminal=verbose)[0]
+		result = cached_compile(p, cache, show_C_terminal=verbose, export_files=export, algorithm=algorithm, beam_width=beam_width, mass_tolerance=tolerance, tolerance_unit=tolerance_unit, charge_range=charge_range, preprocess=preprocess, use_deisotoped=use_deisotoped)
+		if stats:
+			print(p.stats.to_json())
+		list_peptide = result[0]
 		print("Here comes the peptide lists....: ")
 		# show peptide list in STDOUT
 		print(list_peptide)
 		print("-----------------------------------")
-		seq_info = [p.peptide_info(x) for x in list(set(p.compile(show_C_terminal=verbose)[0]))]
-		seq = p.filter_seq
-		sum_intensity = p.filter_peak_intensity
+		seq_info = [p.peptide_info(x) for x in list(set(list_peptide))]
+		seq = result[0]
+		sum_intensity = result[2]
 		lst = zip(seq, sum_intensity)
 		result_p = pd.DataFrame(lst, columns=["Sequence", "Sum of Peak Intensity/ Score"])
 		result_p = result_p.drop_duplicates()
@@ -129,12 +153,20 @@ def get_peptide(ms2_raw: str, scan_number: int, verbose:bool) -> list:
 		# return the details info of peptide
 		return seq_info
 	except:
-		p.precursor_charge()
-		p.precursor_ms()
-		if not p.identify_C_term(p.mass, p.norm_dict) or not p.have_N_term():
-			print("N or C terminal not found by the algorithm.")
-		else:
-			print(p.merge_info)
+		# the reason is also kept for results read from the cache
+		print(p.failure_reason or "N or C terminal not found by the algorithm.")
+
+
+# Remove cached identification results
+@main.command(name = "clear_cache")
+@click.argument('ms2_raw', required=False)
+@click.option('-s', '--scan', default=None, type=int, help="Only remove the results of this scan of MS2_RAW.")
+def clear_cache(ms2_raw: str, scan: int) -> None:
+
+	"""Remove the cached results of one scan, of one MS2 file or (without MS2_RAW) the whole cache."""
+	cache = ResultCache()
+	cache.invalidate(ms2_raw, scan)
+	print(f"Result cache {cache.directory}: {len(cache.entries())} entries, {cache.size()} bytes left")
 
 
 # The eighth CLI for identifying candidate protein
@@ -142,7 +174,8 @@ def get_peptide(ms2_raw: str, scan_number: int, verbose:bool) -> list:
 @click.argument('ms2_raw')
 @click.argument('scan_number')
 @click.option('-v', '--verbose', default=False, is_flag=True, help="When used, will print the C_terminal to STDOUT.")
-def get_protein(ms2_raw: str, scan_number: int, verbose:bool) -> None:
+@click.option('--fasta', default=None, help="Match the peptides to the proteins of this FASTA file. Default: the SPECTRA_PROTEIN_BACKEND environment variable, else the PeptideMatch API.")
+def get_protein(ms2_raw: str, scan_number: int, verbose:bool, fasta:str) -> None:
 	""" Search for candidate proteins from API request.
 
         Parameters
@@ -150,6 +183,7 @@ def get_protein(ms2_raw: str, scan_number: int, verbose:bool) -> None:
         ms2_raw: str
         scan_number: int
         verbose: bool
+        fasta: str
 
         Returns
         -------
@@ -162,10 +196,77 @@ def get_protein(ms2_raw: str, scan_number: int, verbose:bool) -> None:
 	print("--------------------------------------------------------------------------")
 	print("Peptides combination with their corresponding protein info.....")
 	print("###############################################################")
-	peptide_match = Identifier(sequence=list_)
+	backend = LocalBackend(open_index(fasta)) if fasta else None
+	peptide_match = Identifier(sequence=list_, backend=backend)
 	# Print list of proteins
 	print(f"{list} candidate protein info: {pd.DataFrame(peptide_match.stout.items())}")
 
 
+# Build the protein index of a FASTA database
+@main.command(name = "build_index")
+@click.argument('fasta')
+@click.option('-o', '--output', default=None, help="Save the index into this folder. Default: ~/.projectSpectra/index, where the protein command finds it.")
+@click.option('--no-leqi', default=False, is_flag=True, help="When used, I and L are told apart.")
+def build_index(fasta: str, output: str, no_leqi: bool) -> None:
+
+	"""Build the suffix array index of a FASTA database once, later runs memory-map it."""
+	if output:
+		index = ProteinIndex.from_fasta(fasta, leqi=not no_leqi)
+		index.save(output)
+	else:
+		index = open_index(fasta, leqi=not no_leqi)
+	print(f"Protein index of {fasta}: {len(index)} proteins, {index.sequence.size} residues")
+
+
+# Serve a protein index like the PeptideMatch API
+@main.command(name = "match_server")
+@click.argument('fasta')
+@click.option('--host', default="127.0.0.1", help="Host to listen on. Default: 127.0.0.1.")
+@click.option('--port', default=5006, type=int, help="Port to listen on. Default: 5006.")
+def match_server(fasta: str, host: str, port: int) -> None:
+
+	"""Serve the proteins of a FASTA file with the PeptideMatch interface, a local stand-in for offline and load tests."""
+	server = make_stand_in_server(open_index(fasta), host, port)
+	print(f"Serving {fasta}, use SPECTRA_PROTEIN_BACKEND={stand_in_url(server)}")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		server.shutdown()
+
+
+# The ninth CLI for sequencing a whole run
+@main.command(name = 'denovo_batch')
+@click.argument('ms2_raw')
+@click.argument('output_path')
+@click.option('--first', default=None, type=int, help="The first scan number to sequence. Default: the first MS2 scan.")
+@click.option('--last', default=None, type=int, help="The last scan number to sequence. Default: the last MS2 scan.")
+@click.option('-w', '--workers', default=1, type=int, help="Number of worker processes, 0 to use all CPU cores. Default: 1.")
+@click.option('-a', '--algorithm', default="graph", type=click.Choice(ALGORITHMS), help="Spectrum graph search or beam search. Default: graph.")
+@click.option('-b', '--beam-width', default=10, type=int, help="Partial sequences kept per prefix mass and step by the beam search. Default: 10.")
+@click.option('-f', '--format', 'fmt', default=None, type=click.Choice(RESULT_FORMATS), help="Output table format. Default: from the file extension (.csv, .parquet, .arrow, otherwise tab separated).")
+@click.option('--stats-file', default=None, help="When given, the wall time of every stage and the counters of every scan are written to it as JSON lines.")
+@click.option('-t', '--tolerance', default=None, type=float, help="Match monoisotopic masses within this tolerance (high-resolution data). Default: nominal masses.")
+@click.option('--tolerance-unit', default="ppm", type=click.Choice(TOLERANCE_UNITS), help="Unit of --tolerance. Default: ppm.")
+@click.option('--charge-range', default=None, type=(int, int), help="Lowest and highest charge tried when the precursor charge is unknown. Default: skip such scans.")
+@click.option('--min-peaks', default=10, type=int, help="Scans with fewer peaks are rejected before the search. Default: 10.")
+@click.option('--min-ladder-peaks', default=5, type=int, help="Scans with fewer peaks that differ from another peak by an AA mass are rejected before the search. Default: 5.")
+@click.option('-p', '--preprocess', default=None, callback=preprocess_option, help="Peak preprocessing before the search, e.g. 'top_n=10,window=100,min_intensity=1,precursor_tolerance=2'. Default: keep every peak.")
+@click.option('--deisotoped/--raw-peaks', 'use_deisotoped', default=True, help="Search the deisotoped, charge-collapsed peaks or the raw peaks. Default: deisotoped.")
+def batch_peptide(ms2_raw: str, output_path: str, first: int, last: int, workers: int, algorithm: str, beam_width: int, fmt: str, stats_file: str, tolerance: float, tolerance_unit: str, charge_range: tuple, min_peaks: int, min_ladder_peaks: int, preprocess: dict, use_deisotoped: bool) -> None:
+
+	"""Sequence a range of scans (default: all MS2 scans) into one peptide table (.csv, .tsv, .parquet or .arrow)."""
+	scans = select_scans(ms2_raw, first, last)
+	print(f"Sequencing {len(scans)} scans...")
+	options = {"algorithm": algorithm, "beam_width": beam_width, "mass_tolerance": tolerance, "tolerance_unit": tolerance_unit,
+			   "charge_range": charge_range, "min_peaks": min_peaks, "min_ladder_peaks": min_ladder_peaks,
+			   "preprocess": preprocess, "use_deisotoped": use_deisotoped}
+	summary = denovo_batch(ms2_raw, output_path, scans, workers, options, fmt, stats_file)
+	print(f"{summary['rows']} peptides from {summary['identified_scans']} of {summary['scans']} scans written to {output_path}")
+	for reason, count in sorted(summary['failures'].items(), key=lambda x: -x[1]):
+		print(f"{count} scans: {reason}")
+	total = summary['stats']
+	print("Wall time per stage (s): " + ", ".join(f"{name} {seconds:.3f}" for name, seconds in total.timings.items()))
+
+
 if __name__ == "__main__":
 	main()
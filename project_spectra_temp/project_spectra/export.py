@@ -0,0 +1,130 @@
+"""This module is used to write the peptide table of a batch run.
+   Delimited tables (.csv/.tsv) are written row by row, Parquet and Arrow files column-wise in row groups.
+   pyarrow is only needed (and imported) for the columnar formats: pip install project_spectra[parquet]
+"""
+
+import csv
+import os
+
+RESULT_COLUMNS = ["Scan", "Precursor M/Z", "Charge", "Sequence", "Peaks", "Score"]
+RESULT_FORMATS = ("csv", "tsv", "parquet", "arrow")
+
+# file extension -> format, every other extension is written tab separated
+_EXTENSIONS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+
+def result_format(output_file: str) -> str:
+    """Get the table format from the extension of the output file."""
+    return _EXTENSIONS.get(os.path.splitext(output_file)[1].lower(), "tsv")
+
+
+def _import_pyarrow():
+    """Import pyarrow on first use, it is an optional dependency."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet/Arrow output needs pyarrow: pip install project_spectra[parquet]") from e
+    return pyarrow
+
+
+class DelimitedWriter:
+    """Write peptide rows to a .csv or tab separated file, the peak path joined by ';'."""
+
+    def __init__(self, output_file: str, delimiter: str = "\t"):
+        self._file = open(output_file, "w", newline="")
+        self._writer = csv.writer(self._file, delimiter=delimiter)
+        self._writer.writerow(RESULT_COLUMNS)
+
+    def write_row(self, row: list):
+        scan, pre_mz, charge, seq, peaks, score = row
+        self._writer.writerow([scan, pre_mz, charge, seq, ";".join(str(x) for x in peaks), score])
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ColumnarWriter:
+    """
+    Write peptide rows to a Parquet or Arrow IPC file.
+    Rows are collected column-wise and written as one row group every row_group_size rows,
+    so memory stays bounded however many rows a run produces. The peak path is a list<double> column.
+    """
+
+    def __init__(self, output_file: str, fmt: str = "parquet", row_group_size: int = 65536):
+        if fmt not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown columnar format '{fmt}', use parquet or arrow")
+        pa = _import_pyarrow()
+        self._pa = pa
+        self.schema = pa.schema([
+            (RESULT_COLUMNS[0], pa.int64()),
+            (RESULT_COLUMNS[1], pa.float64()),
+            (RESULT_COLUMNS[2], pa.int32()),
+            (RESULT_COLUMNS[3], pa.string()),
+            (RESULT_COLUMNS[4], pa.list_(pa.float64())),
+            (RESULT_COLUMNS[5], pa.float64()),
+        ])
+        if fmt == "parquet":
+            self._writer = pa.parquet.ParquetWriter(output_file, self.schema)
+        else:
+            self._writer = pa.ipc.new_file(output_file, self.schema)
+        self.row_group_size = row_group_size
+        self._columns = [[] for _ in RESULT_COLUMNS]
+
+    def write_row(self, row: list):
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        if len(self._columns[0]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Write the collected rows as one row group."""
+        if not self._columns[0]:
+            return
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(self._columns, self.schema)],
+            schema=self.schema)
+        self._writer.write_table(table)
+        self._columns = [[] for _ in RESULT_COLUMNS]
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_result_writer(output_file: str, fmt: str = None, row_group_size: int = 65536):
+    """
+    Open a writer for the peptide table.
+    Parameters
+    ----------
+    output_file: str
+            The output file
+    fmt: str
+            One of RESULT_FORMATS, None to choose it from the file extension
+    row_group_size: int
+            Rows per row group of the columnar formats
+    Returns
+    -------
+    DelimitedWriter or ColumnarWriter
+    """
+    fmt = fmt or result_format(output_file)
+    if fmt == "csv":
+        return DelimitedWriter(output_file, ",")
+    if fmt == "tsv":
+        return DelimitedWriter(output_file, "\t")
+    if fmt in ("parquet", "arrow"):
+        return ColumnarWriter(output_file, fmt, row_group_size)
+    raise ValueError(f"Unknown output format '{fmt}', use one of {RESULT_FORMATS}")
@@ -0,0 +1,80 @@
+"""This module is used to search the spectrum graph of one scan.
+   Nodes are the precursor and the peaks, edges are the amino acid steps found by the DFS (route_dict).
+   The best peak paths are found by dynamic programming, keeping at most K partial paths per peak.
+"""
+
+from collections import defaultdict
+from operator import itemgetter
+import heapq
+
+
+class SpectrumGraph:
+    """Directed acyclic graph of peaks, every edge goes from a larger to a smaller m/z."""
+
+    def __init__(self, route_dict: dict, source: float):
+        """
+        Parameters
+        ----------
+        route_dict: dict
+                parent peak -> list of child peaks
+        source: float
+                the start node (precursor mass)
+        """
+        self.source = source
+        self.parents = defaultdict(list)
+        nodes = {source}
+        for parent, children in route_dict.items():
+            nodes.add(parent)
+            for child in children:
+                nodes.add(child)
+                self.parents[child].append(parent)
+        # every edge goes to a smaller m/z, so descending m/z is a topological order
+        self.nodes = sorted(nodes, reverse=True)
+        self.n_edges = sum(len(x) for x in self.parents.values())
+
+    def best_paths(self, weight, k: int, accept=None) -> list:
+        """
+        Get the k highest scoring paths from the source.
+        Parameters
+        ----------
+        weight: callable
+                node -> score of the node; a path scores the sum over its nodes after the source
+        k: int
+                number of paths to return, and of partial paths kept per node
+        accept: callable
+                node -> bool, whether a path may end at the node (None: every node except the source)
+
+        Returns
+        -------
+        list of (score, path) with the highest score first, path as list of nodes starting at the source
+        """
+        # per node: up to k entries of (score, parent node, index of the entry in the parent's list)
+        best = {self.source: [(0.0, None, 0)]}
+        for node in self.nodes:
+            if node == self.source:
+                continue
+            w = weight(node)
+            candidates = ((entry[0] + w, parent, i)
+                          for parent in self.parents[node] if parent in best
+                          for i, entry in enumerate(best[parent]))
+            top = heapq.nlargest(k, candidates, key=itemgetter(0))
+            if top:
+                best[node] = top
+
+        ends = ((entries[i][0], node, i)
+                for node, entries in best.items()
+                if node != self.source and (accept is None or accept(node))
+                for i in range(len(entries)))
+        return [(score, self._trace(best, node, i))
+                for score, node, i in heapq.nlargest(k, ends, key=itemgetter(0))]
+
+    @staticmethod
+    def _trace(best: dict, node, i: int) -> list:
+        """Follow the back pointers of an entry to rebuild its path from the source."""
+        path = []
+        while node is not None:
+            path.append(node)
+            _, parent, parent_i = best[node][i]
+            node, i = parent, parent_i
+        path.reverse()
+        return path
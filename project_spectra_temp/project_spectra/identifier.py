@@ -5,18 +5,19 @@
 """
 
 from typing import List
-import json
 import logging
-import requests
 from sqlalchemy.orm import sessionmaker
-from project_spectra.constants import PEPTIDE_MATCH_API
 from project_spectra.models import Base, engine, Protein, Peptide
+from project_spectra.protein_match import ProteinMatchBackend, get_backend
 
 
 class Identifier:
-	"""Retrieves information from a given protein sequence"""
-	def __init__(self, sequence:List):
+	"""Retrieves information from a given protein sequence.
+	   The peptides are matched by the backend (protein_match), default: the SPECTRA_PROTEIN_BACKEND
+	   environment variable, else the PeptideMatch API."""
+	def __init__(self, sequence:List, backend:ProteinMatchBackend = None):
 		self.sequence = sequence
+		self.backend = backend if backend is not None else get_backend()
 		self.results = []
 		self.stout = []
 		self.all_results = []
@@ -24,25 +25,21 @@ class Identifier:
 		# Run methods automatically
 		self.prot_identifier()
 
-	def protein_match_api(self, url_API: str, query: str):
-		"""Get protein information from bioinformatics.udel.edu via API"""
-		requestURL = url_API + str(query)
-		response_API = requests.get(requestURL, headers={"Accept": "application/json"})
-
-		# Check the response status code
-		if response_API.status_code == 200:
-			logging.info('Successfully received data. API: {}'.format(requestURL))
-		else:
-			logging.error('Unsuccessful request. API: {} Status Code:{}'.format(requestURL, response_API.status_code))
-
-		# Get the data from the API
-		data = response_API.content
-		text = response_API.text
-
-		# Parse it
-		json_data = json.loads(data)
-
-		return json_data, text
+	def uncached_identifier(self):
+		"""Identifies the proteins with a backend whose answers are not stored in the database (e.g. a local FASTA index)"""
+		json_data = self.backend.match(self.sequence)
+		if json_data.get('numberFound') == 0:
+			logging.warning('No results found for this peptide: {}.'.format(self.sequence))
+			return
+		self.extract(json_data=json_data)
+		self.all_results = [{'accession_number': result.get("ac"),
+							 'name': result.get("id"),
+							 'full_name': result.get("name"),
+							 'organism': result.get("organism"),
+							 'tax_id': result.get("taxon"),
+							 'sequence': result.get("sequence")
+							 } for result in self.results]
+		self.stout = {each.get('name'): [each.get('full_name'), each.get('organism')] for each in self.all_results}
 
 	def extract(self, json_data):
 		"""Extracts information from peptide match json to list of dictionaries"""
@@ -63,6 +60,11 @@ class Identifier:
 
 	def prot_identifier(self):
 		"""Identifies a protein given a peptide sequence"""
+		# only the answers of the PeptideMatch API are stored in the database, keyed by the peptides
+		if not self.backend.cacheable:
+			self.uncached_identifier()
+			return
+
 		# Start database session
 		Base.metadata.create_all(engine, checkfirst=True)
 		Session = sessionmaker(bind=engine)
@@ -85,10 +87,7 @@ class Identifier:
 			return
 
 		# Run peptide match API
-		all_peptides = '%2C'.join(self.sequence) # Join with a comma value
-
-		query = all_peptides + "&swissprot=false&isoform=false&uniref100=false&leqi=false&offset=0"
-		json_data, text = self.protein_match_api(url_API=PEPTIDE_MATCH_API, query=query)
+		json_data = self.backend.match(self.sequence)
 
 		# Check the response is not empty
 		if json_data.get('numberFound') == 0:
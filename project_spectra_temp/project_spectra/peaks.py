@@ -0,0 +1,77 @@
+"""This module holds the compact peak representation of one spectrum.
+   Peaks are stored as sorted NumPy arrays instead of m/z -> intensity dicts.
+"""
+
+from collections.abc import Mapping
+import numpy as np
+
+
+class PeakArray(Mapping):
+    """
+    Peaks of one spectrum: m/z as sorted float64 array, intensity as float32 array.
+    It can be read like the m/z -> intensity dict it replaces (keys are m/z in ascending order),
+    so code written for dicts keeps working.
+    """
+    __slots__ = ("mz", "intensity", "_nominal")
+
+    def __init__(self, mz, intensity):
+        mz = np.asarray(mz, dtype=np.float64)
+        intensity = np.asarray(intensity, dtype=np.float32)
+        if mz.shape != intensity.shape:
+            raise ValueError("m/z and intensity arrays must have the same length")
+        if mz.size > 1 and np.any(mz[1:] < mz[:-1]):
+            order = np.argsort(mz, kind="stable")
+            mz = mz[order]
+            intensity = intensity[order]
+        self.mz = mz
+        self.intensity = intensity
+        self._nominal = None
+
+    @classmethod
+    def coerce(cls, peaks):
+        """Return peaks as a PeakArray, converting an m/z -> intensity dict if needed."""
+        if isinstance(peaks, cls):
+            return peaks
+        return cls(list(peaks.keys()), list(peaks.values()))
+
+    @property
+    def nominal(self) -> np.ndarray:
+        """m/z truncated to integers (the nominal masses used by the identification)."""
+        if self._nominal is None:
+            self._nominal = np.trunc(self.mz).astype(np.int64)
+        return self._nominal
+
+    def window(self, low: int, high: int) -> slice:
+        """Index range of the peaks whose nominal mass lies in [low, high], found by binary search."""
+        nominal = self.nominal
+        return slice(int(np.searchsorted(nominal, low, side="left")),
+                     int(np.searchsorted(nominal, high, side="right")))
+
+    def mz_window(self, low: float, high: float) -> slice:
+        """Index range of the peaks whose m/z lies in [low, high], found by binary search."""
+        return slice(int(np.searchsorted(self.mz, low, side="left")),
+                     int(np.searchsorted(self.mz, high, side="right")))
+
+    def normalized(self):
+        """Return a copy with intensities as relative abundance (highest peak = 100)."""
+        max_value = self.intensity.max()
+        return PeakArray(self.mz, (self.intensity / max_value) * 100)
+
+    def __getitem__(self, mz):
+        i = np.searchsorted(self.mz, mz)
+        if i < self.mz.size and self.mz[i] == mz:
+            return self.intensity[i]
+        raise KeyError(mz)
+
+    def __contains__(self, mz):
+        i = np.searchsorted(self.mz, mz)
+        return bool(i < self.mz.size and self.mz[i] == mz)
+
+    def __iter__(self):
+        return iter(self.mz)
+
+    def __len__(self):
+        return self.mz.size
+
+    def __repr__(self):
+        return f"PeakArray({self.mz.size} peaks)"
@@ -0,0 +1,93 @@
+"""This module is used to preprocess the peaks of one scan before the search.
+   Low-intensity noise and the precursor peaks are removed, so fewer peaks enter the spectrum graph.
+   Every step works on the sorted arrays of a PeakArray.
+"""
+
+import numpy as np
+from project_spectra.peaks import PeakArray
+from project_spectra.residues import PROTON_MASS
+
+# keyword arguments of preprocess_peaks that can be given as text (parse_preprocess_options)
+PREPROCESS_OPTIONS = {"top_n": int, "window": float, "min_intensity": float, "precursor_tolerance": float}
+
+
+def top_n_per_window(peaks: PeakArray, n: int, window: float = 100.0) -> np.ndarray:
+    """Mask of the n most intense peaks in every m/z window of the given width."""
+    bins = np.floor(peaks.mz / window).astype(np.int64)
+    # sort by window, then by decreasing intensity, and rank the peaks inside their window
+    order = np.lexsort((-peaks.intensity, bins))
+    sorted_bins = bins[order]
+    first = np.searchsorted(sorted_bins, sorted_bins, side="left")
+    rank = np.arange(order.size) - first
+    keep = np.zeros(order.size, dtype=bool)
+    keep[order[rank < n]] = True
+    return keep
+
+
+def above_intensity(peaks: PeakArray, min_intensity: float) -> np.ndarray:
+    """Mask of the peaks with at least min_intensity percent of the highest peak."""
+    if len(peaks) == 0:
+        return np.zeros(0, dtype=bool)
+    return peaks.intensity >= peaks.intensity.max() * min_intensity / 100
+
+
+def outside_precursor(peaks: PeakArray, precursor_mz: float, precursor_charge: int, tolerance: float) -> np.ndarray:
+    """Mask of the peaks farther than tolerance (Da) from the precursor ion at every charge up to its own."""
+    keep = np.ones(len(peaks), dtype=bool)
+    if precursor_charge <= 0:
+        return keep & (np.abs(peaks.mz - precursor_mz) > tolerance)
+    mass = (precursor_mz - PROTON_MASS) * precursor_charge
+    for charge in range(1, precursor_charge + 1):
+        keep &= np.abs(peaks.mz - (mass + charge * PROTON_MASS) / charge) > tolerance
+    return keep
+
+
+def preprocess_peaks(peak_dict, precursor_mz: float = None, precursor_charge: int = 0, top_n: int = None,
+                     window: float = 100.0, min_intensity: float = None, precursor_tolerance: float = None) -> PeakArray:
+    """
+    Remove peaks before the search. Every step is skipped if its parameter is None.
+    Parameters
+    ----------
+    peak_dict: PeakArray or dict (m/z -> intensity)
+    precursor_mz, precursor_charge:
+            The precursor of the scan, needed by precursor_tolerance
+    top_n: int
+            Keep the top_n most intense peaks in every m/z window
+    window: float
+            Width of the m/z windows of top_n (Da)
+    min_intensity: float
+            Keep the peaks with at least this percentage of the highest peak's intensity
+    precursor_tolerance: float
+            Remove the peaks within this distance (Da) of the precursor ion (at every charge up to its own)
+
+    Returns
+    -------
+    PeakArray of the kept peaks
+    """
+    peaks = PeakArray.coerce(peak_dict)
+    keep = np.ones(len(peaks), dtype=bool)
+    if precursor_tolerance is not None and precursor_mz is not None:
+        keep &= outside_precursor(peaks, precursor_mz, precursor_charge, precursor_tolerance)
+    if min_intensity is not None:
+        keep &= above_intensity(peaks, min_intensity)
+    if top_n is not None:
+        keep &= top_n_per_window(peaks, top_n, window)
+    if keep.all():
+        return peaks
+    return PeakArray(peaks.mz[keep], peaks.intensity[keep])
+
+
+def parse_preprocess_options(text: str) -> dict:
+    """
+    Parse preprocessing options written as "top_n=10,window=100,min_intensity=1,precursor_tolerance=2",
+    the format of the CLI option and of the SPECTRA_PREPROCESS environment variable of the web app.
+    Returns the keyword arguments of preprocess_peaks (empty for no preprocessing).
+    """
+    options = {}
+    for item in filter(None, (x.strip() for x in (text or "").split(","))):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in PREPROCESS_OPTIONS:
+            raise ValueError(f"Unknown preprocessing option '{name}', use one of {tuple(PREPROCESS_OPTIONS)}")
+        options[name] = PREPROCESS_OPTIONS[name](value)
+    return options
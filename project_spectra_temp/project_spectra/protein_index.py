@@ -0,0 +1,293 @@
+"""This module is used to match peptides to the proteins of a local FASTA database, without the PeptideMatch API.
+   The protein sequences are concatenated (separated by '$') and a suffix array over them is built once,
+   then every peptide is found by binary search. I and L are not told apart (as in the de novo sequences).
+   The answer has the shape of the PeptideMatch JSON, so Identifier reads it like the API response.
+   An index is saved as flat binary files and memory-mapped when loaded (open_index builds it once per FASTA),
+   so processes start without rebuilding it and share its pages.
+"""
+
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+import numpy as np
+from project_spectra.cache import known_file_digest
+
+INDEX_DIR = Path(Path.home(), ".projectSpectra", "index")
+# version of the files written by ProteinIndex.save, an index of another version is built again
+INDEX_FORMAT = 1
+
+SEPARATOR = ord("$")
+# I/L equivalence: the de novo sequencing cannot tell them apart (same mass), both are indexed as L
+_LEQI = bytes.maketrans(b"I", b"L")
+_ORGANISM = re.compile(r"\bOS=(.*?)(?=\s\w+=|$)")
+_TAXON = re.compile(r"\bOX=(\d+)")
+
+
+def read_fasta(fasta_file: str):
+    """Iterate over the (header, sequence) of every protein of a FASTA file."""
+    header, lines = None, []
+    with open(fasta_file) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(lines)
+                header, lines = line[1:], []
+            elif line:
+                lines.append(line)
+    if header is not None:
+        yield header, "".join(lines)
+
+
+def parse_header(header: str) -> dict:
+    """
+    Get the protein info from a FASTA header, e.g. UniProt
+    'sp|P69905|HBA_HUMAN Hemoglobin subunit alpha OS=Homo sapiens OX=9606 GN=HBA1 PE=1 SV=2'.
+    Returns a dict with the PeptideMatch keys ac, id, name, orgName, orgTaxonId.
+    """
+    first, _, description = header.partition(" ")
+    parts = first.split("|")
+    ac, protein_id = (parts[1], parts[2]) if len(parts) >= 3 else (first, first)
+    organism = _ORGANISM.search(description)
+    taxon = _TAXON.search(description)
+    return {"ac": ac,
+            "id": protein_id,
+            "name": re.split(r"\s\w{2}=", description)[0].strip(),
+            "orgName": organism.group(1) if organism else None,
+            "orgTaxonId": int(taxon.group(1)) if taxon else None}
+
+
+def suffix_array(text: np.ndarray) -> np.ndarray:
+    """
+    Suffix array of a byte array by prefix doubling: the suffixes are sorted by their first 2^k bytes,
+    with one argsort of (rank of the first half, rank of the second half) per step.
+    """
+    n = text.size
+    rank = text.astype(np.int64)
+    sa = np.arange(n)
+    k = 1
+    while n > 1:
+        second = np.zeros(n, dtype=np.int64)
+        second[:max(n - k, 0)] = rank[k:] + 1
+        key = rank * (n + 257) + second
+        sa = np.argsort(key)
+        sorted_key = key[sa]
+        new_rank = np.empty(n, dtype=np.int64)
+        new_rank[sa] = np.concatenate(([0], np.cumsum(sorted_key[1:] != sorted_key[:-1])))
+        rank = new_rank
+        if rank.max() == n - 1 or k >= n:
+            break
+        k *= 2
+    return sa.astype(np.int32 if n < 2 ** 31 else np.int64)
+
+
+class FlatStrings:
+    """Read-only list of strings stored as one byte array and the offset of every string (offsets[-1] is the end)."""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, strings: list) -> "FlatStrings":
+        encoded = [x.encode() for x in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(x) for x in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return self.offsets.size - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode()
+
+
+class ProteinIndex:
+    """
+    Suffix array index of a protein database.
+    Parameters
+    ----------
+    sequence: np.ndarray
+            The protein sequences (uint8), concatenated with a separator after every protein
+    text: np.ndarray
+            sequence with I replaced by L (the searched text), or sequence itself if I and L are told apart
+    suffix: np.ndarray
+            Suffix array of text
+    starts: np.ndarray
+            Offset of every protein in sequence
+    headers: FlatStrings
+            FASTA header of every protein, parsed when a protein is reported (parse_header)
+    leqi: bool
+            Whether I and L are equivalent
+    """
+
+    # file of every array in a saved index
+    FILES = {"sequence": "sequence.bin", "text": "text.bin", "suffix": "suffix.bin", "starts": "starts.bin",
+             "headers": "headers.bin", "header_offsets": "header_offsets.bin"}
+
+    def __init__(self, sequence: np.ndarray, text: np.ndarray, suffix: np.ndarray, starts: np.ndarray,
+                 headers: FlatStrings, leqi: bool = True):
+        self.sequence = sequence
+        self.text = text
+        self.suffix = suffix
+        self.starts = starts
+        self.headers = headers
+        self.leqi = leqi
+        self._buffer = memoryview(text)
+
+    @classmethod
+    def from_fasta(cls, fasta_file: str, leqi: bool = True) -> "ProteinIndex":
+        """Read a FASTA file and build its index."""
+        headers, chunks, starts = [], [], []
+        offset = 0
+        for header, seq in read_fasta(fasta_file):
+            seq = seq.upper().encode()
+            headers.append(header)
+            starts.append(offset)
+            chunks.append(seq + bytes([SEPARATOR]))
+            offset += len(seq) + 1
+        raw = b"".join(chunks)
+        sequence = np.frombuffer(raw, dtype=np.uint8)
+        text = np.frombuffer(raw.translate(_LEQI), dtype=np.uint8) if leqi else sequence
+        return cls(sequence, text, suffix_array(text), np.asarray(starts, dtype=np.int64),
+                   FlatStrings.from_list(headers), leqi)
+
+    def save(self, directory: str) -> None:
+        """Write the index as flat binary files and index.json (format, dtypes, sizes) into directory."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {"sequence": self.sequence, "suffix": self.suffix, "starts": self.starts,
+                  "headers": self.headers.data, "header_offsets": self.headers.offsets}
+        if self.leqi:
+            arrays["text"] = self.text
+        for name, array in arrays.items():
+            np.ascontiguousarray(array).tofile(directory / self.FILES[name])
+        meta = {"format": INDEX_FORMAT, "leqi": self.leqi, "proteins": len(self), "residues": int(self.sequence.size),
+                "dtypes": {name: str(array.dtype) for name, array in arrays.items()}}
+        (directory / "index.json").write_text(json.dumps(meta))
+
+    @classmethod
+    def load(cls, directory: str) -> "ProteinIndex":
+        """Open a saved index, every array is memory-mapped read-only."""
+        directory = Path(directory)
+        meta = json.loads((directory / "index.json").read_text())
+        if meta.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Protein index {directory} has format {meta.get('format')}, expected {INDEX_FORMAT}")
+        arrays = {name: _map(directory / cls.FILES[name], dtype) for name, dtype in meta["dtypes"].items()}
+        sequence = arrays["sequence"]
+        return cls(sequence, arrays.get("text", sequence), arrays["suffix"], arrays["starts"],
+                   FlatStrings(arrays["headers"], arrays["header_offsets"]), meta["leqi"])
+
+    def __len__(self):
+        return len(self.headers)
+
+    def _suffix(self, i: int, length: int) -> bytes:
+        start = int(self.suffix[i])
+        return bytes(self._buffer[start:start + length])
+
+    def _range(self, pattern: bytes) -> tuple:
+        """Range [first, last) of the suffix array whose suffixes start with pattern."""
+        m = len(pattern)
+        lo, hi = 0, self.suffix.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._suffix(mid, m) < pattern:
+                lo = mid + 1
+            else:
+                hi = mid
+        first, hi = lo, self.suffix.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._suffix(mid, m) == pattern:
+                lo = mid + 1
+            else:
+                hi = mid
+        return first, lo
+
+    def find(self, peptide: str, leqi: bool = None) -> np.ndarray:
+        """
+        Indices of the proteins that contain the peptide (sorted, unique).
+        leqi tells whether I and L are equivalent for this search, default: as the index was built.
+        An index built with I/L equivalence tells them apart by checking the sequence of every hit;
+        one built without it cannot search with I/L equivalence (ValueError).
+        """
+        leqi = self.leqi if leqi is None else leqi
+        if leqi and not self.leqi:
+            raise ValueError("The protein index was built without I/L equivalence (leqi)")
+        exact = peptide.upper().encode()
+        pattern = exact.translate(_LEQI) if self.leqi else exact
+        if not pattern or SEPARATOR in pattern:
+            return np.zeros(0, dtype=np.int64)
+        first, last = self._range(pattern)
+        positions = self.suffix[first:last]
+        if self.leqi and not leqi:
+            positions = np.asarray([x for x in positions if bytes(self.sequence[x:x + len(exact)]) == exact],
+                                   dtype=positions.dtype)
+        return np.unique(np.searchsorted(self.starts, positions, side="right") - 1)
+
+    def protein_sequence(self, i: int) -> str:
+        end = self.starts[i + 1] - 1 if i + 1 < len(self.starts) else self.sequence.size - 1
+        return bytes(self.sequence[self.starts[i]:end]).decode()
+
+    def protein(self, i: int) -> dict:
+        """Info and sequence of one protein, with the PeptideMatch keys."""
+        return {**parse_header(self.headers[i]), "sequence": self.protein_sequence(i)}
+
+    def match(self, peptides: list, leqi: bool = None) -> dict:
+        """Peptide -> indices of the proteins containing it."""
+        return {peptide: self.find(peptide, leqi) for peptide in peptides}
+
+    def peptide_match(self, peptides: list, leqi: bool = None) -> dict:
+        """The proteins of every peptide, in the shape of the PeptideMatch JSON (numberFound, results)."""
+        results = []
+        number_found = 0
+        for peptide, hits in self.match(peptides, leqi).items():
+            proteins = [self.protein(int(i)) for i in hits]
+            number_found += len(proteins)
+            results.append({"peptide": peptide, "proteins": proteins})
+        return {"numberFound": number_found, "results": results}
+
+
+def _map(path: Path, dtype: str) -> np.ndarray:
+    """Memory-map a flat binary file read-only (an empty file gives an empty array, which mmap refuses)."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def open_index(fasta_file: str, directory: str = None, leqi: bool = True) -> ProteinIndex:
+    """
+    Load the saved index of a FASTA file, built and saved on first use.
+    Parameters
+    ----------
+    fasta_file: str
+            The protein database
+    directory: str
+            Folder of the saved indices, default ~/.projectSpectra/index (or the SPECTRA_INDEX_DIR environment variable);
+            every index is saved in a subfolder named by the content hash of the FASTA file
+    leqi: bool
+            Whether I and L are equivalent
+    Returns
+    -------
+    ProteinIndex with memory-mapped arrays
+    """
+    directory = Path(directory or os.environ.get("SPECTRA_INDEX_DIR", INDEX_DIR))
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = known_file_digest(fasta_file, directory / "files.json")
+    folder = directory / f"{digest}{'' if leqi else '-noleqi'}"
+    try:
+        return ProteinIndex.load(folder)
+    except (OSError, ValueError, KeyError):
+        pass
+    # build next to the final folder and move it there, so another process never loads a partial index
+    tmp = directory / f"{folder.name}.{os.getpid()}.tmp"
+    ProteinIndex.from_fasta(fasta_file, leqi).save(tmp)
+    shutil.rmtree(folder, ignore_errors=True)
+    try:
+        os.replace(tmp, folder)
+    except OSError:
+        # another process saved the same index meanwhile
+        shutil.rmtree(tmp, ignore_errors=True)
+    return ProteinIndex.load(folder)
@@ -0,0 +1,135 @@
+"""This module holds the backends that match peptides to proteins for Identifier.
+   Every backend answers with the PeptideMatch JSON (numberFound, results with their proteins):
+   RemoteBackend asks the PeptideMatch API (or any server with the same interface), LocalBackend a local
+   FASTA index, and make_stand_in_server serves a local index over HTTP like the PeptideMatch API,
+   for offline integration and load tests.
+   The backend of a deployment is chosen by the SPECTRA_PROTEIN_BACKEND environment variable (get_backend).
+"""
+
+from abc import ABC, abstractmethod
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import requests
+from project_spectra.constants import PEPTIDE_MATCH_API
+from project_spectra.protein_index import ProteinIndex, open_index
+
+BACKEND_VARIABLE = "SPECTRA_PROTEIN_BACKEND"
+# query options of the PeptideMatch API, after the peptides
+_QUERY_OPTIONS = "&swissprot=false&isoform=false&uniref100=false&leqi=false&offset=0"
+
+
+class ProteinMatchBackend(ABC):
+    """Interface of the protein match backends."""
+
+    # whether the answers are stored in the peptide database (only those of the PeptideMatch API)
+    cacheable = False
+
+    @abstractmethod
+    def match(self, peptides: list) -> dict:
+        """The proteins of every peptide as PeptideMatch JSON."""
+
+
+class RemoteBackend(ProteinMatchBackend):
+    """The PeptideMatch API, or a server with the same interface at url (e.g. the stand-in server)."""
+
+    def __init__(self, url: str = PEPTIDE_MATCH_API, timeout: float = 60):
+        self.url = url
+        self.timeout = timeout
+        self.cacheable = url == PEPTIDE_MATCH_API
+
+    def match(self, peptides: list) -> dict:
+        """Get protein information from bioinformatics.udel.edu (or the server at url) via API"""
+        requestURL = self.url + '%2C'.join(peptides) + _QUERY_OPTIONS
+        response_API = requests.get(requestURL, headers={"Accept": "application/json"}, timeout=self.timeout)
+
+        # Check the response status code
+        if response_API.status_code == 200:
+            logging.info('Successfully received data. API: {}'.format(requestURL))
+        else:
+            logging.error('Unsuccessful request. API: {} Status Code:{}'.format(requestURL, response_API.status_code))
+        return json.loads(response_API.content)
+
+
+class LocalBackend(ProteinMatchBackend):
+    """A local FASTA database (ProteinIndex)."""
+
+    def __init__(self, index: ProteinIndex):
+        self.index = index
+
+    def match(self, peptides: list) -> dict:
+        return self.index.peptide_match(peptides)
+
+
+def get_backend(spec: str = None) -> ProteinMatchBackend:
+    """
+    Get the backend described by spec, default: the SPECTRA_PROTEIN_BACKEND environment variable.
+    Parameters
+    ----------
+    spec: str
+            "remote" (default): the PeptideMatch API
+            "local:/path/to/proteins.fasta": the saved index of a FASTA file (see protein_index.open_index)
+            "http://host:port/...match_get?peptides=": a server with the PeptideMatch interface
+    """
+    spec = spec or os.environ.get(BACKEND_VARIABLE) or "remote"
+    if spec == "remote":
+        return RemoteBackend()
+    if spec.startswith("local:"):
+        return LocalBackend(open_index(spec[len("local:"):]))
+    if spec.startswith(("http://", "https://")):
+        return RemoteBackend(spec)
+    raise ValueError(f"Unknown protein match backend '{spec}', use remote, local:<fasta> or an http(s) URL")
+
+
+class _MatchHandler(BaseHTTPRequestHandler):
+    """Answer GET .../match_get?peptides=A,B&leqi=false like the PeptideMatch API, from self.server.index.
+       As in the API, I and L are told apart unless leqi=true (RemoteBackend sends leqi=false)."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.endswith("/match_get"):
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        peptides = [x for x in query.get("peptides", [""])[0].split(",") if x]
+        leqi = query.get("leqi", ["false"])[0].lower() == "true"
+        try:
+            body = json.dumps(self.server.index.peptide_match(peptides, leqi)).encode()
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_stand_in_server(index: ProteinIndex, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    HTTP server with the PeptideMatch interface, answering from a local index.
+    port 0 picks a free port; the backend URL is stand_in_url(server).
+    Call serve_forever() (or start_stand_in_server for a background thread) and shutdown() to stop.
+    """
+    server = ThreadingHTTPServer((host, port), _MatchHandler)
+    server.index = index
+    return server
+
+
+def stand_in_url(server: ThreadingHTTPServer) -> str:
+    """The backend URL (SPECTRA_PROTEIN_BACKEND) of a stand-in server."""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/peptidematchapi2/match_get?peptides="
+
+
+def start_stand_in_server(index: ProteinIndex, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start a stand-in server in a daemon thread, e.g. for integration tests."""
+    server = make_stand_in_server(index, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,103 @@
+"""This module holds the amino acid residue masses used by the de novo sequencing.
+   The tables are built once at import, are read-only and shared by all Peptide_identification instances.
+"""
+
+from types import MappingProxyType
+import numpy as np
+
+# Amino Acid -> nominal mass
+AA_CODE = MappingProxyType({
+    'A': 71, 'C': 103, 'D': 115, 'E': 129, 'F': 147,
+    'G': 57, 'H': 137, 'I': 113, 'K': 128, 'L': 113,
+    'M': 131, 'N': 114, 'P': 97, 'Q': 128, 'R': 156,
+    'S': 87, 'T': 101, 'V': 99, 'W': 186, 'Y': 163,
+})
+
+AA_LIST = tuple(AA_CODE.keys())
+AA_MASSES = tuple(AA_CODE.values())
+
+# O(1) membership of a nominal mass difference
+AA_MASS_SET = frozenset(AA_MASSES)
+
+# nominal mass -> residues of that mass (I/L and K/Q share one), in AA_CODE order
+MASS_TO_AA = MappingProxyType({
+    mass: tuple(aa for aa in AA_LIST if AA_CODE[aa] == mass) for mass in sorted(AA_MASS_SET)
+})
+
+# bitmap over nominal masses for vectorised membership tests
+_AA_MASS_BITMAP = np.zeros(max(AA_MASSES) + 1, dtype=bool)
+_AA_MASS_BITMAP[list(AA_MASS_SET)] = True
+_AA_MASS_BITMAP.setflags(write=False)
+
+
+def is_aa_mass(mass_diff) -> np.ndarray:
+    """Vectorised test of which nominal mass differences match an amino acid."""
+    mass_diff = np.asarray(mass_diff, dtype=np.int64)
+    inside = (mass_diff >= 0) & (mass_diff < _AA_MASS_BITMAP.size)
+    result = np.zeros(mass_diff.shape, dtype=bool)
+    result[inside] = _AA_MASS_BITMAP[mass_diff[inside]]
+    return result
+
+
+def aa_of_mass(mass: int) -> str:
+    """Get the amino acid of a nominal mass (the first one in AA_CODE order if several share it)."""
+    return MASS_TO_AA[mass][0]
+
+
+# Amino Acid -> monoisotopic residue mass, for the high-accuracy mode
+AA_MONO_MASS = MappingProxyType({
+    'A': 71.03711, 'C': 103.00919, 'D': 115.02694, 'E': 129.04259, 'F': 147.06841,
+    'G': 57.02146, 'H': 137.05891, 'I': 113.08406, 'K': 128.09496, 'L': 113.08406,
+    'M': 131.04049, 'N': 114.04293, 'P': 97.05276, 'Q': 128.05858, 'R': 156.10111,
+    'S': 87.03203, 'T': 101.04768, 'V': 99.06841, 'W': 186.07931, 'Y': 163.06333,
+})
+H2O_MASS = 18.010565
+NH3_MASS = 17.026549
+PROTON_MASS = 1.007276
+
+# sorted distinct monoisotopic masses and their residue (the first in AA_CODE order, so I for I/L)
+MONO_MASSES = np.array(sorted(set(AA_MONO_MASS.values())))
+MONO_MASSES.setflags(write=False)
+MONO_AA = tuple(next(aa for aa in AA_LIST if AA_MONO_MASS[aa] == mass) for mass in MONO_MASSES)
+
+TOLERANCE_UNITS = ("ppm", "Da")
+
+
+def tolerance_da(mz, tolerance: float, unit: str = "ppm"):
+    """Absolute tolerance (Da) at m/z for a tolerance in ppm or Da."""
+    if unit == "ppm":
+        return np.asarray(mz, dtype=np.float64) * tolerance * 1e-6
+    if unit == "Da":
+        return np.full(np.shape(mz), tolerance, dtype=np.float64)
+    raise ValueError(f"Unknown tolerance unit '{unit}', use one of {TOLERANCE_UNITS}")
+
+
+def match_mono_mass(mass_diff, tolerance) -> np.ndarray:
+    """
+    Vectorised tolerance match of mass differences against the monoisotopic residue masses.
+    The sorted mass array is binary searched and the nearer neighbour is checked.
+    Parameters
+    ----------
+    mass_diff: array of mass differences
+    tolerance: absolute tolerance in Da, scalar or one per mass difference
+    Returns
+    -------
+    index into MONO_MASSES / MONO_AA of the matched residue, -1 where nothing matches
+    """
+    mass_diff = np.asarray(mass_diff, dtype=np.float64)
+    right = np.clip(np.searchsorted(MONO_MASSES, mass_diff), 1, MONO_MASSES.size - 1)
+    left = right - 1
+    nearest = np.where(mass_diff - MONO_MASSES[left] <= MONO_MASSES[right] - mass_diff, left, right)
+    error = np.abs(mass_diff - MONO_MASSES[nearest])
+    return np.where(error <= tolerance, nearest, -1)
+
+
+def is_mono_aa_mass(mass_diff, tolerance) -> np.ndarray:
+    """Vectorised test of which mass differences match an amino acid within the tolerance (Da)."""
+    return match_mono_mass(mass_diff, tolerance) >= 0
+
+
+def aa_of_mono_mass(mass_diff: float, tolerance: float) -> str:
+    """Get the amino acid of a mass difference within the tolerance (Da), None if none matches."""
+    i = int(match_mono_mass(mass_diff, tolerance))
+    return MONO_AA[i] if i >= 0 else None
@@ -0,0 +1,53 @@
+"""This module holds the per-scan instrumentation of the identification.
+   Every stage records its wall time, and the stages record counters (peaks, graph size, paths),
+   so a slow scan can be traced to the stage that spends the time.
+"""
+
+import json
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class ScanStats:
+    """Wall time per stage (seconds) and counters of one scan (or the sum over many scans)."""
+
+    def __init__(self, scan: int = None):
+        self.scan = scan
+        self.timings = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block and add it to the wall time of the stage."""
+        start = perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_time(name, perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int) -> None:
+        """Set a counter, e.g. count("peaks_in", 120)."""
+        self.counters[name] = int(value)
+
+    def add(self, other: "ScanStats") -> None:
+        """Add the timings and counters of another scan, to get the totals of a batch run."""
+        for name, seconds in other.timings.items():
+            self.add_time(name, seconds)
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.timings.values())
+
+    def to_dict(self) -> dict:
+        return {"scan": self.scan, "timings": dict(self.timings), "counters": dict(self.counters)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def __repr__(self):
+        return f"ScanStats(scan={self.scan}, {self.total_time:.4f} s, {self.counters})"
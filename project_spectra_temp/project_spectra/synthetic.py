@@ -0,0 +1,124 @@
+"""This module is used to generate synthetic MS2 spectra with known peptides.
+   The b/y-ion ladders come from the pyopenms TheoreticalSpectrumGenerator, random noise peaks are added on top,
+   so scaling and accuracy can be tested without instrument data.
+"""
+
+import numpy as np
+from pyopenms import *
+
+# residues of random peptides, K and R only at the C terminal (trypsin)
+_INNER_AA = "ACDEFGHILMNPSTVWY"
+_C_TERM_AA = "KR"
+
+
+def random_peptide(rng: np.random.Generator, min_length: int = 7, max_length: int = 15) -> str:
+    """Get a random tryptic peptide (ends with K or R)."""
+    length = int(rng.integers(min_length, max_length + 1))
+    inner = rng.choice(list(_INNER_AA), length - 1)
+    return "".join(inner) + str(rng.choice(list(_C_TERM_AA)))
+
+
+def theoretical_peaks(peptide: str, max_fragment_charge: int = 1) -> tuple:
+    """
+    Get the b- and y-ion ladder of a peptide.
+    Parameters
+    ----------
+    peptide: str
+            The peptide sequence (one letter codes, pyopenms modifications allowed)
+    max_fragment_charge: int
+            Fragment ions are generated with charge 1 to max_fragment_charge
+    Returns
+    -------
+    (m/z array, intensity array) sorted by m/z, every intensity 1
+    """
+    generator = TheoreticalSpectrumGenerator()
+    param = generator.getParameters()
+    param.setValue("add_b_ions", "true")
+    param.setValue("add_y_ions", "true")
+    param.setValue("add_metainfo", "false")
+    generator.setParameters(param)
+
+    spec = MSSpectrum()
+    generator.getSpectrum(spec, AASequence.fromString(peptide), 1, max_fragment_charge)
+    return spec.get_peaks()
+
+
+def synthetic_spectrum(peptide: str, charge: int = 2, n_noise: int = 0, noise_level: float = 0.2,
+                       max_fragment_charge: int = 1, rng: np.random.Generator = None) -> MSSpectrum:
+    """
+    Build the MS2 spectrum of one peptide.
+    Parameters
+    ----------
+    peptide: str
+            The peptide sequence
+    charge: int
+            Charge of the precursor
+    n_noise: int
+            Number of random noise peaks, spread uniformly between 50 and the precursor mass
+    noise_level: float
+            Highest noise intensity relative to the highest ladder peak
+    max_fragment_charge: int
+            Fragment ions are generated with charge 1 to max_fragment_charge
+    rng: np.random.Generator
+            Random generator of the intensities and noise (default: seeded with 0)
+    Returns
+    -------
+    MSSpectrum of MS level 2 with the precursor m/z and charge set
+    """
+    rng = np.random.default_rng(0) if rng is None else rng
+    sequence = AASequence.fromString(peptide)
+    mz, _ = theoretical_peaks(peptide, max_fragment_charge)
+    intensity = rng.uniform(50, 100, mz.size)
+
+    noise_mz = rng.uniform(50, sequence.getMonoWeight(), n_noise)
+    noise_intensity = rng.uniform(0, 100 * noise_level, n_noise)
+    mz = np.concatenate([mz, noise_mz])
+    intensity = np.concatenate([intensity, noise_intensity])
+    order = np.argsort(mz)
+
+    spec = MSSpectrum()
+    spec.set_peaks((mz[order], intensity[order].astype(np.float32)))
+    spec.setMSLevel(2)
+    precursor = Precursor()
+    precursor.setMZ(sequence.getMZ(charge))
+    precursor.setCharge(charge)
+    spec.setPrecursors([precursor])
+    return spec
+
+
+def write_synthetic_run(output_file: str, n_scans: int, peptides: list = None, charges: tuple = (2,),
+                        n_noise: int = 0, noise_level: float = 0.2, max_fragment_charge: int = 1,
+                        seed: int = 0) -> list:
+    """
+    Write an mzML run of n_scans synthetic MS2 spectra.
+    Parameters
+    ----------
+    output_file: str
+            The output .mzML file
+    n_scans: int
+            Number of scans
+    peptides: list
+            Peptide of every scan, cycled if shorter than n_scans; None for random tryptic peptides
+    charges: tuple
+            Precursor charges, every scan gets one at random
+    n_noise, noise_level, max_fragment_charge:
+            see synthetic_spectrum
+    seed: int
+            Seed of the random generator, the same seed writes the same run
+    Returns
+    -------
+    list of (peptide, charge) of every scan, the ground truth of the run
+    """
+    rng = np.random.default_rng(seed)
+    exp = MSExperiment()
+    truth = []
+    for scan in range(n_scans):
+        peptide = peptides[scan % len(peptides)] if peptides else random_peptide(rng)
+        charge = int(rng.choice(charges))
+        spec = synthetic_spectrum(peptide, charge, n_noise, noise_level, max_fragment_charge, rng)
+        spec.setRT(float(scan))
+        spec.setNativeID(f"scan={scan}")
+        exp.addSpectrum(spec)
+        truth.append((peptide, charge))
+    MzMLFile().store(output_file, exp)
+    return truth
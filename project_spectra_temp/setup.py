@@ -4,12 +4,14 @@
 
 from setuptools import setup, find_packages
 
-requirements = ['pyopenms', 'pandas', 'matplotlib',
+requirements = ['pyopenms', 'numpy', 'pandas', 'matplotlib',
                 'typing', 'requests', 'sqlalchemy',
                 'pathlib', 'sqlalchemy_utils', 'click']
 
 test_requirements = ['pytest>=3', ]
 
+extras_requirements = {'parquet': ['pyarrow'], 'bench': ['pytest-benchmark']}
+
 setup(
     author="Group 5",
     author_email='dingmingliu@outlook.com',
@@ -27,6 +29,7 @@ setup(
         'Programming Language :: Python :: 3.10',
     ],
     description="Group 5 Spectra Package",
+    extras_require=extras_requirements,
     entry_points={
         'console_scripts': [
             'project_spectra=project_spectra.cli:main',
@@ -0,0 +1,103 @@
+"""Unit test for batch."""
+
+import json
+import os
+import pytest
+import pandas as pd
+from project_spectra.batch import RESULT_COLUMNS, denovo_batch, iter_identifications, select_scans
+
+
+class TestBatch:
+    """Test code for project_spectra.batch"""
+
+    ms2_file = 'data/test_ms2.mzML'
+
+    def test_select_scans(self):
+        """Test function select_scans"""
+        assert select_scans(self.ms2_file, 2, 5) == [2, 3, 4, 5]
+        assert len(select_scans(self.ms2_file)) > 0
+
+    def test_denovo_batch(self, tmp_path):
+        """Test function denovo_batch"""
+        output_file = os.path.join(str(tmp_path), 'peptides.tsv')
+        summary = denovo_batch(self.ms2_file, output_file, scans=[0, 1, 3])
+        assert summary['scans'] == 3
+        df = pd.read_csv(output_file, sep='\t')
+        assert list(df.columns) == RESULT_COLUMNS
+        assert len(df) == summary['rows']
+        assert sum(summary['failures'].values()) == summary['scans'] - summary['identified_scans']
+        assert 3 in set(df['Scan'])
+        assert set(df['Scan']) <= {0, 1, 3}
+
+    def test_denovo_batch_workers(self, tmp_path):
+        """Test function denovo_batch with a process pool"""
+        serial_file = os.path.join(str(tmp_path), 'serial.tsv')
+        parallel_file = os.path.join(str(tmp_path), 'parallel.tsv')
+        denovo_batch(self.ms2_file, serial_file, scans=list(range(6)))
+        denovo_batch(self.ms2_file, parallel_file, scans=list(range(6)), workers=2)
+        assert open(serial_file).read() == open(parallel_file).read()
+
+    def test_iter_identifications(self):
+        """Test function iter_identifications"""
+        results = list(iter_identifications(self.ms2_file, scans=[0, 1, 3]))
+        assert [x.scan for x in results] == [0, 1, 3]
+        assert results[2].sequences and results[2].failure_reason is None
+        assert len(results[2].sequences) == len(results[2].peaks) == len(results[2].scores)
+        for result in results:
+            assert result.sequences or result.failure_reason
+        # stopping early does not sequence the remaining scans
+        first = next(iter_identifications(self.ms2_file, scans=[0, 1, 3]))
+        assert first._replace(stats=None) == results[0]._replace(stats=None)
+
+    def test_iter_identifications_deisotoped(self):
+        """Test that the batch searches the deisotoped peaks like compile, unless use_deisotoped is False"""
+        from project_spectra.Spec_peptide import Peptide_identification
+        deisotoped = list(iter_identifications(self.ms2_file, scans=[3]))[0]
+        raw = list(iter_identifications(self.ms2_file, scans=[3], options={"use_deisotoped": False}))[0]
+        assert deisotoped.stats.counters["peaks_in"] == raw.stats.counters["peaks_in"]
+        assert deisotoped.stats.counters["peaks_deisotoped"] < deisotoped.stats.counters["peaks_in"]
+        assert "peaks_deisotoped" not in raw.stats.counters
+        pi = Peptide_identification(self.ms2_file, 3)
+        assert deisotoped.sequences == pi.compile(False)[0]
+        assert raw.sequences == pi.compile(False, use_deisotoped=False)[0]
+
+    def test_sequence_scan_peaks_charge_range(self):
+        """Test that a scan of unknown charge reports the charge it was sequenced at"""
+        from project_spectra.batch import sequence_scan_peaks
+        from project_spectra.synthetic import synthetic_spectrum
+        spec = synthetic_spectrum("SAMPLER", 2)
+        mz, intensity = spec.get_peaks()
+        task = (0, mz, intensity, spec.getPrecursors()[0].getMZ(), 0, 0.0)
+        result = sequence_scan_peaks(task, {"charge_range": (1, 3)})
+        assert "SAMPIER" in result.sequences
+        assert result.charge == 2
+        skipped = sequence_scan_peaks(task)
+        assert skipped.charge == 0
+        assert "deisotope" not in skipped.stats.timings
+
+    def test_denovo_batch_parquet(self, tmp_path):
+        """Test function denovo_batch with Parquet and Arrow output"""
+        pq = pytest.importorskip('pyarrow.parquet')
+        ipc = pytest.importorskip('pyarrow.ipc')
+        tsv_file = os.path.join(str(tmp_path), 'peptides.tsv')
+        parquet_file = os.path.join(str(tmp_path), 'peptides.parquet')
+        arrow_file = os.path.join(str(tmp_path), 'peptides.arrow')
+        summary = denovo_batch(self.ms2_file, tsv_file, scans=[0, 1, 3])
+        denovo_batch(self.ms2_file, parquet_file, scans=[0, 1, 3])
+        denovo_batch(self.ms2_file, arrow_file, scans=[0, 1, 3])
+        table = pq.read_table(parquet_file)
+        assert table.column_names == RESULT_COLUMNS
+        assert table.num_rows == summary['rows']
+        assert ipc.open_file(arrow_file).read_all().equals(table)
+        df = pd.read_csv(tsv_file, sep='\t')
+        assert table.column('Sequence').to_pylist() == list(df['Sequence'])
+        assert ";".join(str(x) for x in table.column('Peaks')[0].as_py()) == df['Peaks'][0]
+
+    def test_denovo_batch_stats(self, tmp_path):
+        """Test function denovo_batch with a stats file"""
+        output_file = os.path.join(str(tmp_path), 'peptides.tsv')
+        stats_file = os.path.join(str(tmp_path), 'stats.jsonl')
+        summary = denovo_batch(self.ms2_file, output_file, scans=[0, 1, 3], stats_file=stats_file)
+        lines = [json.loads(x) for x in open(stats_file)]
+        assert [x['scan'] for x in lines] == [0, 1, 3]
+        assert summary['stats'].counters['peaks_in'] == sum(x['counters']['peaks_in'] for x in lines)
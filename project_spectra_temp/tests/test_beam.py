@@ -0,0 +1,35 @@
+"""Unit test for beam."""
+
+from project_spectra.beam import beam_search
+from project_spectra.peaks import PeakArray
+
+
+class TestBeamSearch:
+    """Test code for project_spectra.beam"""
+
+    # 714 -A-> 643 -A-> 572 -S-> 485, plus a noise peak at 610
+    peaks = PeakArray([485.2, 572.3, 610.1, 643.4], [50, 80, 100, 30])
+
+    def test_beam_search(self):
+        """Test function beam_search"""
+        paths = beam_search(self.peaks, 714.5, [485], beam_width=5)
+        assert paths == [(160.0, [714.5, 643.4, 572.3, 485.2])]
+
+    def test_beam_search_per_prefix_mass(self):
+        """Test that the beam keeps the best partial sequences of every prefix mass"""
+        # an intense dead end at 657 (714 -G-> 657) does not push the ladder out of a beam of width 1
+        peaks = PeakArray([485.2, 572.3, 643.4, 657.3], [50, 80, 30, 200])
+        paths = beam_search(peaks, 714.5, [485], beam_width=1)
+        assert paths == [(160.0, [714.5, 643.4, 572.3, 485.2])]
+
+    def test_beam_search_remaining_mass(self):
+        """Test partial sequences that cannot reach an end peak are dropped"""
+        assert beam_search(self.peaks, 714.5, [520], beam_width=5) == []
+        assert beam_search(self.peaks, 714.5, [], beam_width=5) == []
+
+    def test_beam_search_accurate(self):
+        """Test beam search with monoisotopic masses"""
+        # 714.40 -A-> 643.363 -A-> 572.326 -S-> 485.294, a noise peak 0.05 Da off the second A
+        peaks = PeakArray([485.29397, 572.32600, 572.37600, 643.36311], [50, 80, 100, 30])
+        paths = beam_search(peaks, 714.40022, [485.29397], beam_width=5, tolerance=lambda mz: 0.01)
+        assert [path for score, path in paths] == [[714.40022, 643.36311, 572.32600, 485.29397]]
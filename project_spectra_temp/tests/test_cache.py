@@ -0,0 +1,71 @@
+"""Unit test for cache."""
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from project_spectra.cache import ResultCache, cached_compile, params_key, write_atomic
+from project_spectra.Spec_peptide import Peptide_identification
+
+MS2_FILE = 'data/test_ms2.mzML'
+
+
+def test_params_key():
+    assert params_key({"algorithm": "graph", "beam_width": 10}) == params_key({"beam_width": 10, "algorithm": "graph"})
+    assert params_key({"algorithm": "graph"}) == params_key({"algorithm": "graph", "show_C_terminal": True})
+    assert params_key({"algorithm": "graph"}) != params_key({"algorithm": "beam"})
+
+
+def test_get_put_invalidate(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    assert cache.get(MS2_FILE, 3, {}) is None
+    cache.put(MS2_FILE, 3, {}, ([["SAMPLER"]], None))
+    cache.put(MS2_FILE, 3, {"algorithm": "beam"}, (None, "no peptide"))
+    cache.put(MS2_FILE, 4, {}, (None, "no peptide"))
+    assert cache.get(MS2_FILE, 3, {}) == ([["SAMPLER"]], None)
+    assert cache.get(MS2_FILE, 3, {"algorithm": "beam"}) == (None, "no peptide")
+    cache.invalidate(MS2_FILE, 3)
+    assert cache.get(MS2_FILE, 3, {}) is None and cache.get(MS2_FILE, 4, {}) is not None
+    cache.invalidate()
+    assert cache.entries() == []
+
+
+def test_file_content_key(tmp_path):
+    """The same path with another content gets other entries"""
+    cache = ResultCache(tmp_path / "cache")
+    ms2_file = str(tmp_path / "ms2.mzML")
+    shutil.copy(MS2_FILE, ms2_file)
+    cache.put(ms2_file, 0, {}, "old")
+    with open(ms2_file, "ab") as f:
+        f.write(b"\n")
+    assert cache.get(ms2_file, 0, {}) is None
+
+
+def test_write_atomic_threads(tmp_path):
+    """Test that threads writing the same file do not share a temporary file"""
+    path = tmp_path / "entry.pkl"
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: write_atomic(path, bytes([i]) * 100000), range(64)))
+    data = path.read_bytes()
+    assert data == data[:1] * 100000
+    assert os.listdir(tmp_path) == ["entry.pkl"]
+
+
+def test_evict(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=3500)
+    for scan in range(3):
+        cache.put(MS2_FILE, scan, {}, b"x" * 1000)
+        path = cache.entry_path(MS2_FILE, scan, {})
+        os.utime(path, (scan, scan))
+    cache.get(MS2_FILE, 0, {})
+    cache.put(MS2_FILE, 3, {}, b"x" * 1000)
+    # scan 1 is the least recently used
+    assert [cache.get(MS2_FILE, scan, {}) is not None for scan in range(4)] == [True, False, True, True]
+
+
+def test_cached_compile(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    p = Peptide_identification(MS2_FILE, 3)
+    result = cached_compile(p, cache, show_C_terminal=False)
+    p = Peptide_identification(MS2_FILE, 3)
+    assert cached_compile(p, cache, show_C_terminal=False) == result
+    assert set(p.stats.timings) == {"cache"}
@@ -0,0 +1,38 @@
+"""Unit test for export."""
+
+import os
+import pytest
+from project_spectra.export import RESULT_COLUMNS, open_result_writer, result_format
+
+
+class TestExport:
+    """Test code for project_spectra.export"""
+
+    rows = [[0, 500.5, 2, 'GAK', [999.0, 871.5, 800.5], 150.0],
+            [0, 500.5, 2, 'GAR', [999.0, 871.5, 843.4], 120.0],
+            [3, 610.2, 2, 'AK', [1219.4, 1148.3], 90.0]]
+
+    def test_result_format(self):
+        """Test function result_format"""
+        assert result_format('out.csv') == 'csv'
+        assert result_format('out.PARQUET') == 'parquet'
+        assert result_format('out.arrow') == 'arrow'
+        assert result_format('out.txt') == 'tsv'
+
+    def test_row_groups(self, tmp_path):
+        """Test that ColumnarWriter writes one row group per row_group_size rows"""
+        pq = pytest.importorskip('pyarrow.parquet')
+        output_file = os.path.join(str(tmp_path), 'peptides.parquet')
+        with open_result_writer(output_file, row_group_size=2) as writer:
+            for row in self.rows:
+                writer.write_row(row)
+        parquet = pq.ParquetFile(output_file)
+        assert parquet.metadata.num_row_groups == 2
+        table = parquet.read()
+        assert table.column_names == RESULT_COLUMNS
+        assert [list(x.values()) for x in table.to_pylist()] == self.rows
+
+    def test_unknown_format(self, tmp_path):
+        """Test that an unknown format raises ValueError"""
+        with pytest.raises(ValueError):
+            open_result_writer(os.path.join(str(tmp_path), 'peptides.xls'), 'xls')
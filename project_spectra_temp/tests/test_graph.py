@@ -0,0 +1,31 @@
+"""Unit test for graph."""
+
+from project_spectra.graph import SpectrumGraph
+
+
+class TestSpectrumGraph:
+    """Test code for project_spectra.graph"""
+
+    # 500 -> 400 -> 300 -> 200, with shortcuts 500 -> 300 and 400 -> 200
+    route_dict = {500.0: [300.0, 400.0], 400.0: [200.0, 300.0], 300.0: [200.0]}
+    weight = {300.0: 5.0, 400.0: 1.0, 200.0: 2.0}
+
+    def test_nodes(self):
+        """Test the nodes are in topological (descending) order"""
+        graph = SpectrumGraph(self.route_dict, 500.0)
+        assert graph.nodes == [500.0, 400.0, 300.0, 200.0]
+        assert graph.n_edges == 5
+
+    def test_best_paths(self):
+        """Test function best_paths"""
+        graph = SpectrumGraph(self.route_dict, 500.0)
+        paths = graph.best_paths(self.weight.get, 2, accept=lambda x: x == 200.0)
+        assert paths == [(8.0, [500.0, 400.0, 300.0, 200.0]), (7.0, [500.0, 300.0, 200.0])]
+
+    def test_best_paths_all_ends(self):
+        """Test function best_paths without accept: every node can end a path"""
+        graph = SpectrumGraph(self.route_dict, 500.0)
+        paths = graph.best_paths(self.weight.get, 10)
+        # 3 paths end at 200, 2 at 300 and 1 at 400
+        assert len(paths) == 6
+        assert [x[0] for x in paths] == sorted([x[0] for x in paths], reverse=True)
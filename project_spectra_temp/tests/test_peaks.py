@@ -0,0 +1,38 @@
+"""Unit test for peaks."""
+
+import numpy as np
+from project_spectra.peaks import PeakArray
+
+
+class TestPeakArray:
+    """Test code for project_spectra.peaks"""
+
+    def test_sorted_arrays(self):
+        """Test PeakArray sorts peaks by m/z and keeps compact dtypes"""
+        peaks = PeakArray([300.5, 100.25, 200.75], [3, 1, 2])
+        assert list(peaks.mz) == [100.25, 200.75, 300.5]
+        assert list(peaks.intensity) == [1, 2, 3]
+        assert peaks.mz.dtype == np.float64
+        assert peaks.intensity.dtype == np.float32
+        assert list(peaks.nominal) == [100, 200, 300]
+
+    def test_mapping(self):
+        """Test PeakArray reads like a m/z -> intensity dict"""
+        d = {100.25: 1.0, 200.75: 4.0}
+        peaks = PeakArray.coerce(d)
+        assert dict(peaks) == d
+        assert 200.75 in peaks
+        assert 200.0 not in peaks
+        assert peaks[100.25] == 1.0
+
+    def test_normalized(self):
+        """Test function normalized"""
+        peaks = PeakArray([100.0, 200.0], [50, 200]).normalized()
+        assert list(peaks.intensity) == [25, 100]
+
+    def test_window(self):
+        """Test function window"""
+        peaks = PeakArray([99.9, 100.2, 100.8, 150.5, 157.0, 158.1], [1] * 6)
+        assert list(peaks.mz[peaks.window(100, 157)]) == [100.2, 100.8, 150.5, 157.0]
+        assert peaks.mz[peaks.window(160, 170)].size == 0
+        assert list(peaks.mz[peaks.mz_window(100.0, 157.0)]) == [100.2, 100.8, 150.5, 157.0]
@@ -0,0 +1,41 @@
+"""Unit test for preprocess."""
+
+import numpy as np
+import pytest
+from project_spectra.peaks import PeakArray
+from project_spectra.preprocess import (top_n_per_window, above_intensity, outside_precursor, preprocess_peaks,
+                                        parse_preprocess_options)
+from project_spectra.residues import PROTON_MASS
+
+PEAKS = PeakArray(np.array([110.0, 120.0, 150.0, 210.0, 250.0, 290.0, 501.0]),
+                  np.array([5.0, 30.0, 10.0, 100.0, 1.0, 40.0, 60.0]))
+
+
+def test_top_n_per_window():
+    keep = top_n_per_window(PEAKS, 2, window=100.0)
+    assert PEAKS.mz[keep].tolist() == [120.0, 150.0, 210.0, 290.0, 501.0]
+
+
+def test_above_intensity():
+    assert PEAKS.mz[above_intensity(PEAKS, 30)].tolist() == [120.0, 210.0, 290.0, 501.0]
+    assert above_intensity(PeakArray.coerce({}), 30).size == 0
+
+
+def test_outside_precursor():
+    # neutral mass 1000: [M+H]+ 1001.007, [M+2H]2+ 501.007
+    precursor_mz = 500 + PROTON_MASS
+    assert PEAKS.mz[~outside_precursor(PEAKS, precursor_mz, 2, 0.5)].tolist() == [501.0]
+
+
+def test_preprocess_peaks():
+    assert preprocess_peaks(PEAKS) is PEAKS
+    result = preprocess_peaks(dict(zip(PEAKS.mz, PEAKS.intensity)), 500 + PROTON_MASS, 2,
+                              top_n=2, min_intensity=10, precursor_tolerance=0.5)
+    assert result.mz.tolist() == [120.0, 150.0, 210.0, 290.0]
+
+
+def test_parse_preprocess_options():
+    assert parse_preprocess_options(None) == {}
+    assert parse_preprocess_options("top_n=10, min_intensity=1.5") == {"top_n": 10, "min_intensity": 1.5}
+    with pytest.raises(ValueError):
+        parse_preprocess_options("top=10")
@@ -0,0 +1,84 @@
+"""Unit test for protein_index."""
+
+import shutil
+import pytest
+import numpy as np
+from project_spectra.protein_index import ProteinIndex, open_index, parse_header, read_fasta, suffix_array
+from project_spectra.identifier import Identifier
+from project_spectra.protein_match import LocalBackend
+
+FASTA_FILE = 'data/test_proteins.fasta'
+index = ProteinIndex.from_fasta(FASTA_FILE)
+
+
+def test_read_fasta():
+    proteins = list(read_fasta(FASTA_FILE))
+    assert len(proteins) == 4
+    assert proteins[0][1].startswith("MKTAYIAKQ") and proteins[0][1].endswith("VDQWDWE")
+    assert proteins[3] == ("custom_protein no UniProt header", "PEPTIDEKPEPTLDER")
+
+
+def test_parse_header():
+    info = parse_header("sp|P69905|HBA_HUMAN Hemoglobin subunit alpha OS=Homo sapiens OX=9606 GN=HBA1 PE=1 SV=2")
+    assert info == {"ac": "P69905", "id": "HBA_HUMAN", "name": "Hemoglobin subunit alpha",
+                    "orgName": "Homo sapiens", "orgTaxonId": 9606}
+    assert parse_header("custom_protein no UniProt header")["id"] == "custom_protein"
+
+
+def test_suffix_array():
+    text = b"SAMPLER$SAMPIER$PEPTIDE$"
+    sa = suffix_array(np.frombuffer(text, dtype=np.uint8))
+    assert list(sa) == sorted(range(len(text)), key=lambda i: text[i:])
+
+
+def test_find():
+    # I/L equivalence, every occurrence in a protein counts once
+    assert index.find("SAMPLER").tolist() == [1, 2]
+    assert index.find("sampier").tolist() == [1, 2]
+    assert index.find("PEPTLDEK").tolist() == [3]
+    assert index.find("WDWE").tolist() == [0]
+    assert index.find("ERMG").size == 0
+    assert index.find("").size == 0
+    assert ProteinIndex.from_fasta(FASTA_FILE, leqi=False).find("SAMPIER").tolist() == [1]
+    # an I/L equivalent index tells them apart on request
+    assert index.find("SAMPIER", leqi=False).tolist() == [1]
+    with pytest.raises(ValueError):
+        ProteinIndex.from_fasta(FASTA_FILE, leqi=False).find("SAMPIER", leqi=True)
+
+
+def test_peptide_match():
+    json_data = index.peptide_match(["SAMPLER", "QQQQ"])
+    assert json_data["numberFound"] == 2
+    proteins = json_data["results"][0]["proteins"]
+    assert proteins[0]["id"] == "TEST2_MOUSE"
+    assert proteins[0]["sequence"] == "MSAMPLERGHWTEEKSAMPIERDDNPQRWGHK"
+    assert json_data["results"][1]["proteins"] == []
+
+
+def test_local_identifier():
+    ID = Identifier(["SAMPIER", "PEPTIDEK"], backend=LocalBackend(index))
+    assert ID.stout == {"TEST2_MOUSE": ["Test protein two", "Mus musculus"],
+                        "A0A001_YEAST": ["Uncharacterized protein", "Saccharomyces cerevisiae"],
+                        "custom_protein": ["no UniProt header", None]}
+
+
+def test_save_load(tmp_path):
+    index.save(tmp_path / "index")
+    loaded = ProteinIndex.load(tmp_path / "index")
+    assert isinstance(loaded.suffix, np.memmap) and isinstance(loaded.text, np.memmap)
+    assert len(loaded) == len(index)
+    assert loaded.peptide_match(["SAMPIER", "PEPTIDEK"]) == index.peptide_match(["SAMPIER", "PEPTIDEK"])
+
+
+def test_open_index(tmp_path):
+    fasta_file = tmp_path / "proteins.fasta"
+    shutil.copy(FASTA_FILE, fasta_file)
+    first = open_index(str(fasta_file), tmp_path / "index")
+    assert first.find("SAMPIER").tolist() == [1, 2]
+    assert len(list((tmp_path / "index").glob("*/index.json"))) == 1
+    # the saved index is loaded, a changed FASTA file gets a new one
+    assert open_index(str(fasta_file), tmp_path / "index").find("SAMPIER").tolist() == [1, 2]
+    with open(fasta_file, "a") as f:
+        f.write(">new_protein\nSAMPLERK\n")
+    assert open_index(str(fasta_file), tmp_path / "index").find("SAMPIER").tolist() == [1, 2, 4]
+    assert len(list((tmp_path / "index").glob("*/index.json"))) == 2
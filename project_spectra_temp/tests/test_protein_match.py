@@ -0,0 +1,60 @@
+"""Unit test for protein_match."""
+
+import pytest
+import requests
+from project_spectra.constants import PEPTIDE_MATCH_API
+from project_spectra.identifier import Identifier
+from project_spectra.protein_index import ProteinIndex
+from project_spectra.protein_match import (LocalBackend, ProteinMatchBackend, RemoteBackend, get_backend,
+                                           start_stand_in_server, stand_in_url)
+
+FASTA_FILE = 'data/test_proteins.fasta'
+index = ProteinIndex.from_fasta(FASTA_FILE)
+
+
+@pytest.fixture
+def server():
+    server = start_stand_in_server(index)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_backend(monkeypatch, tmp_path):
+    monkeypatch.delenv("SPECTRA_PROTEIN_BACKEND", raising=False)
+    # the index of the local backend is saved in tmp_path, not in ~/.projectSpectra
+    monkeypatch.setenv("SPECTRA_INDEX_DIR", str(tmp_path))
+    backend = get_backend()
+    assert isinstance(backend, RemoteBackend) and backend.url == PEPTIDE_MATCH_API and backend.cacheable
+    monkeypatch.setenv("SPECTRA_PROTEIN_BACKEND", "http://localhost:5006/match_get?peptides=")
+    backend = get_backend()
+    assert isinstance(backend, RemoteBackend) and not backend.cacheable
+    backend = get_backend("local:" + FASTA_FILE)
+    assert isinstance(backend, LocalBackend) and backend.index.find("SAMPIER").tolist() == [1, 2]
+    assert (tmp_path / "files.json").exists()
+    with pytest.raises(ValueError):
+        get_backend("ftp://localhost")
+
+
+def test_backend_interface():
+    """A backend without match cannot be created"""
+    class Incomplete(ProteinMatchBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    assert isinstance(LocalBackend(index), ProteinMatchBackend)
+
+
+def test_stand_in_server(server):
+    """The stand-in server answers like the local index, and Identifier reads it like the PeptideMatch API"""
+    backend = RemoteBackend(stand_in_url(server))
+    peptides = ["SAMPIER", "PEPTIDEK"]
+    # RemoteBackend asks for leqi=false, so I and L are told apart as by the PeptideMatch API
+    exact = LocalBackend(ProteinIndex.from_fasta(FASTA_FILE, leqi=False))
+    assert backend.match(peptides) == exact.match(peptides) == index.peptide_match(peptides, leqi=False)
+    assert Identifier(peptides, backend=backend).stout == Identifier(peptides, backend=exact).stout
+    leqi = requests.get(stand_in_url(server) + "SAMPIER&leqi=true").json()
+    assert leqi == LocalBackend(index).match(["SAMPIER"]) != backend.match(["SAMPIER"])
+    assert Identifier(["WWWWW"], backend=backend).stout == []
+    assert requests.get(stand_in_url(server).replace("match_get", "other")).status_code == 404
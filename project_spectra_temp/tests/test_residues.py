@@ -0,0 +1,31 @@
+"""Unit test for residues."""
+
+import numpy as np
+from project_spectra.residues import (AA_CODE, AA_MASS_SET, MASS_TO_AA, aa_of_mass, aa_of_mono_mass, is_aa_mass,
+                                      match_mono_mass, tolerance_da)
+
+
+class TestResidues:
+    """Test code for project_spectra.residues"""
+
+    def test_tables(self):
+        """Test the shared residue mass tables"""
+        assert AA_CODE['W'] == 186
+        assert 113 in AA_MASS_SET
+        assert MASS_TO_AA[113] == ('I', 'L')
+        assert aa_of_mass(128) == 'K'
+
+    def test_is_aa_mass(self):
+        """Test function is_aa_mass"""
+        result = is_aa_mass(np.array([-57, 0, 57, 58, 186, 187, 1000]))
+        assert list(result) == [False, False, True, False, True, False, False]
+
+    def test_match_mono_mass(self):
+        """Test the tolerance matching of monoisotopic masses"""
+        assert aa_of_mono_mass(128.0586, 0.005) == 'Q'
+        assert aa_of_mono_mass(128.0950, 0.005) == 'K'
+        assert aa_of_mono_mass(113.0841, 0.005) == 'I'
+        assert aa_of_mono_mass(128.0770, 0.005) is None
+        assert list(match_mono_mass([57.0, 57.02, 500.0], 0.01) >= 0) == [False, True, False]
+        assert np.isclose(tolerance_da(1000.0, 10, "ppm"), 0.01)
+        assert np.isclose(tolerance_da(1000.0, 0.02, "Da"), 0.02)
@@ -1,8 +1,11 @@
 """Unit test for Spec_peptide."""
 
-from project_spectra.Spec_peptide import Spectrum_processing, Peptide_identification
+from project_spectra.Spec_peptide import Spectrum_processing, Peptide_identification, NO_LADDER, TOO_FEW_PEAKS
+from project_spectra.residues import PROTON_MASS
 from project_spectra.startup import data_path
+from project_spectra.synthetic import synthetic_spectrum
 import os
+from pyopenms import AASequence
 import pandas as pd
 from collections import Counter
 
@@ -10,13 +13,19 @@ class TestSpecPeptide:
     """Test code for project_spectra.Spec_peptide."""
 
     # global variable for testing
-    sp = Spectrum_processing(ms2_file='data/test_ms2.mzML', ms2_scan_number=0)
-    pi = Peptide_identification(ms2_file='data/test_ms2.mzML', scan_number=0)
+    sp = Spectrum_processing(ms2_file='data/test_ms2.mzML', ms2_scan_number=3)
+    pi = Peptide_identification(ms2_file='data/test_ms2.mzML', scan_number=3)
 
     def test_store_one_scan_and_get_deisotoped(self):
         """Test function store_one_scan_and_get_deisotoped"""
         self.sp.store_one_scan_and_get_deisotoped()
-        assert os.path.exists(data_path+'/0_deisotoped.mzML')
+        assert os.path.exists(data_path+'/3_deisotoped.mzML')
+
+    def test_deisotope(self):
+        """Test function deisotope"""
+        mz, intensity = self.sp.deisotope()
+        assert len(mz) == len(intensity) == self.sp.de_scan_size
+        assert self.sp.de_scan_size <= self.sp.full_scan_size
 
     def test_normalization(self):
         """Test function normalization"""
@@ -47,11 +56,11 @@ class TestSpecPeptide:
     def test_plot_spectrum(self):
         """Test function plot_spectrum"""
         self.sp.plot_spectrum(False)
-        assert os.path.exists(data_path+"/0_deisotoped.jpg")
+        assert os.path.exists(data_path+"/3_deisotoped.jpg")
 
     def test_parse_scan_data(self):
         """Test function parse_scan_data"""
-        df, mz_dict = self.sp.parse_scan_data(data_path+"/0_deisotoped.mzML")
+        df, mz_dict = self.sp.parse_scan_data(data_path+"/3_deisotoped.mzML")
         assert isinstance(df, pd.DataFrame)
         assert isinstance(mz_dict, dict)
 
@@ -63,14 +72,129 @@ class TestSpecPeptide:
         assert result == True
 
     def test_compile(self):
-        """Test function compile. Execute this first to generate attributes in class."""
-        assert isinstance(self.pi.compile(False), list)
+        """Test function compile. Execute this first to generate attributes in class.
+           The raw peaks are searched, as by the step by step tests below."""
+        assert isinstance(self.pi.compile(False, use_deisotoped=False), list)
+
+    def test_compile_deisotoped(self):
+        """Test that compile searches the deisotoped peaks by default"""
+        pi = Peptide_identification(ms2_file='data/test_ms2.mzML', scan_number=3)
+        assert isinstance(pi.compile(False), list)
+        assert set(pi.norm_dict.keys()) == set(pi.deisotoped_peaks[0])
+        assert pi.de_scan_size < pi.full_scan_size
+        # the deisotoped peaks are preprocessed before the spectrum graph is built
+        pi.compile(False, preprocess={"top_n": 5})
+        stages = list(pi.stats.timings)
+        assert stages.index("deisotope") < stages.index("preprocess") < stages.index("dfs")
+
+    def test_compile_export(self):
+        """Test that the export writes the deisotoped spectrum that was searched and keeps the counters"""
+        pi = Peptide_identification(ms2_file='data/test_ms2.mzML', scan_number=3)
+        pi.compile(False, export_files=True)
+        assert pi.stats.counters["peaks_deisotoped"] == len(pi.norm_dict) == pi.de_scan_size
+        df, _ = pi.parse_scan_data(pi.deisotoped_file)
+        assert len(df) == pi.de_scan_size
+
+    def test_compile_beam(self):
+        """Test function compile with beam search"""
+        pi = Peptide_identification(ms2_file='data/test_ms2.mzML', scan_number=3)
+        result = pi.compile(False, algorithm="beam", beam_width=5)
+        assert isinstance(result, list)
+        assert len(result[0]) > 0
+
+    def test_compile_stats(self):
+        """Test that compile records the stage timings and counters"""
+        pi = Peptide_identification(ms2_file='data/test_ms2.mzML', scan_number=3)
+        pi.compile(False)
+        assert {"load", "deisotope", "C_term", "dfs", "graph_search"} <= set(pi.stats.timings)
+        assert pi.stats.counters["peaks_in"] == pi.full_scan_size
+        assert pi.stats.counters["peaks_deisotoped"] == pi.de_scan_size < pi.full_scan_size
+        assert pi.stats.counters["graph_edges"] == pi.graph_size[1]
+        assert pi.stats.counters["peptides"] == len(pi.filter_seq)
+
+    def test_compile_memoised(self):
+        """Test that compile returns the memoised result until a parameter changes or it is invalidated"""
+        pi = Peptide_identification(ms2_file='data/test_ms2.mzML', scan_number=3)
+        result = pi.compile(False)
+        stats = pi.stats
+        assert pi.compile(False) is result and pi.stats is stats
+        beam = pi.compile(False, algorithm="beam")
+        assert beam is not result and pi.stats is not stats
+        assert pi.compile(False) is not result
+        assert pi.compile(False) == result
+        memoised = pi.compile(False)
+        pi.invalidate()
+        assert pi.compile(False) is not memoised
+
+    def test_identify_peaks_charge(self):
+        """Test the neutral precursor mass and scans of unknown charge"""
+        spec = synthetic_spectrum("SAMPLER", 2)
+        precursor = spec.getPrecursors()[0]
+        pi = Peptide_identification(None, 0)
+        pi.set_peaks(*spec.get_peaks(), precursor.getMZ(), 0)
+        assert pi.identify_peaks(pi.scan_peaks()) is None
+        assert pi.failure_reason == "unknown precursor charge, scan skipped."
+        assert "peaks_in" not in pi.stats.counters
+        # a scan of unknown charge is skipped before it is deisotoped
+        assert pi.identify_peaks() is None
+        assert "deisotope" not in pi.stats.timings
+        calls = []
+        identify_charge = pi.identify_charge
+        pi.identify_charge = lambda charge, *args: calls.append(charge) or identify_charge(charge, *args)
+        result = pi.identify_peaks(pi.scan_peaks(), charge_range=(1, 3))
+        assert "SAMPIER" in result[0]
+        # every charge is searched once, the attributes are those of the best one
+        assert calls == [1, 2, 3]
+        assert pi.charge == 2 and pi.filter_seq == list(result[0])
+        assert abs(pi.mass - AASequence.fromString("SAMPLER").getMonoWeight()) < 1e-6
+
+    def test_prefilter(self):
+        """Test function prefilter and that compile skips the deisotoping of rejected scans"""
+        pi = Peptide_identification(ms2_file='data/test_ms2.mzML', scan_number=3)
+        assert pi.prefilter(pi.scan_peaks())
+        assert pi.count_ladder_peaks({500.5: 1, 443.4: 1, 372.3: 1, 300.0: 1}) == 3
+        pi.set_mass_tolerance(0.02, "Da")
+        assert pi.count_ladder_peaks({500.5: 1, 443.4785: 1, 372.4414: 1, 372.3: 1}) == 3
+        pi.set_mass_tolerance(None)
+        assert not pi.prefilter({500.5: 1, 443.4: 1}, min_peaks=3)
+        assert pi.failure_reason == TOO_FEW_PEAKS
+        assert not pi.prefilter({500.5: 1, 443.4: 1, 300.0: 1}, min_peaks=3, min_ladder_peaks=3)
+        assert pi.failure_reason == NO_LADDER
+        assert pi.compile(False, min_peaks=1000, use_deisotoped=False) is None
+        assert pi.rejected and pi.failure_reason == TOO_FEW_PEAKS
+        assert "deisotope" not in pi.stats.timings
+        assert pi.compile(False, min_peaks=1000) is None
+        assert pi.failure_reason == TOO_FEW_PEAKS
+        assert "deisotope" not in pi.stats.timings
+
+    def test_identify_peaks_accurate(self):
+        """Test the high-accuracy mode on a synthetic spectrum of a known peptide"""
+        spec = synthetic_spectrum("GASPVTLNDKEMHFYWR", 2, n_noise=200)
+        precursor = spec.getPrecursors()[0]
+        pi = Peptide_identification(None, 0)
+        pi.set_peaks(*spec.get_peaks(), precursor.getMZ(), precursor.getCharge())
+        result = pi.identify_peaks(pi.scan_peaks(), mass_tolerance=10, tolerance_unit="ppm")
+        assert "GASPVTINDKEMHFYWR" in result[0]
+        assert pi.graph_size[1] < 50
+
+    def test_identify_peaks_preprocess(self):
+        """Test that preprocessing a noisy spectrum shrinks the graph and keeps the peptide"""
+        spec = synthetic_spectrum("GASPVTLNDKEMHFYWR", 2, n_noise=1000)
+        precursor = spec.getPrecursors()[0]
+        pi = Peptide_identification(None, 0)
+        pi.set_peaks(*spec.get_peaks(), precursor.getMZ(), precursor.getCharge())
+        result = pi.identify_peaks(pi.scan_peaks(), preprocess={"top_n": 5, "precursor_tolerance": 2.0})
+        assert "GASPVTINDKEMHFYWR" in result[0]
+        assert pi.stats.counters["peaks_preprocessed"] < pi.stats.counters["peaks_in"] / 5
+        assert pi.graph_size[1] < 200
 
     def test_get_up_downstream_peak_dict(self):
         """Test function get_up_downstream_peak_dict"""
         result = self.pi.get_up_downstream_peak_dict(dict_norm=norm_dic)
         assert isinstance(result, dict)
-        assert mass in result.keys()
+        # the ladder starts at [M+H]+
+        assert self.pi.root in result.keys()
+        assert self.pi.root == mass + PROTON_MASS
 
     def test_get_peak_pair(self):
         """Test function get_peak_pair"""
@@ -98,7 +222,9 @@ class TestSpecPeptide:
         new_list = self.pi.get_peak_list(merge_list=merged_list)
         assert isinstance(new_list, list)
         for i in range(3):
-            assert len(merged_list[i]) + 1 == len(new_list[i])
+            # each peak list is a merged list plus one child peak of its last peak
+            assert new_list[i][:-1] in merged_list
+            assert new_list[i][-1] in self.pi.route_dict[new_list[i][-2]]
 
     def test_get_peptide_list(self):
         """Test function get_peptide_list"""
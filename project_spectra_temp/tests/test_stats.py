@@ -0,0 +1,31 @@
+"""Unit test for stats."""
+
+import json
+from project_spectra.stats import ScanStats
+
+
+class TestStats:
+    """Test code for project_spectra.stats"""
+
+    def test_stage(self):
+        """Test that stage adds up the wall time of a stage"""
+        stats = ScanStats(3)
+        with stats.stage("dfs"):
+            pass
+        first = stats.timings["dfs"]
+        with stats.stage("dfs"):
+            pass
+        assert stats.timings["dfs"] >= first >= 0
+        assert stats.total_time == stats.timings["dfs"]
+
+    def test_add(self):
+        """Test function add and to_json"""
+        total = ScanStats()
+        for scan in range(2):
+            stats = ScanStats(scan)
+            stats.add_time("load", 0.5)
+            stats.count("peaks_in", 10)
+            total.add(stats)
+        assert total.timings == {"load": 1.0}
+        assert total.counters == {"peaks_in": 20}
+        assert json.loads(stats.to_json()) == {"scan": 1, "timings": {"load": 0.5}, "counters": {"peaks_in": 10}}
@@ -0,0 +1,48 @@
+"""Unit test for synthetic."""
+
+import os
+import numpy as np
+from pyopenms import AASequence
+from project_spectra.Parse_data_MS2 import get_ms2_scan_numbers, parse_data_from_MS2
+from project_spectra.synthetic import random_peptide, synthetic_spectrum, theoretical_peaks, write_synthetic_run
+
+
+class TestSynthetic:
+    """Test code for project_spectra.synthetic"""
+
+    def test_random_peptide(self):
+        """Test function random_peptide"""
+        rng = np.random.default_rng(0)
+        for _ in range(10):
+            peptide = random_peptide(rng, 7, 9)
+            assert 7 <= len(peptide) <= 9
+            assert peptide[-1] in "KR"
+
+    def test_theoretical_peaks(self):
+        """Test that the ladder holds the b- and y-ions"""
+        mz, intensity = theoretical_peaks("SAMPLER")
+        # b2..b6 (b1 is left out by the generator) and y1..y6
+        assert mz.size == 11
+        y1 = AASequence.fromString("R").getMonoWeight() + 1.00728
+        assert np.isclose(mz, y1, atol=0.01).any()
+
+    def test_synthetic_spectrum(self):
+        """Test function synthetic_spectrum"""
+        spec = synthetic_spectrum("SAMPLER", charge=3, n_noise=20, max_fragment_charge=2)
+        mz, intensity = spec.get_peaks()
+        assert mz.size == 22 + 20
+        assert np.all(np.diff(mz) >= 0)
+        precursor = spec.getPrecursors()[0]
+        assert precursor.getCharge() == 3
+        assert np.isclose(precursor.getMZ(), AASequence.fromString("SAMPLER").getMZ(3))
+
+    def test_write_synthetic_run(self, tmp_path):
+        """Test function write_synthetic_run"""
+        output_file = os.path.join(str(tmp_path), 'synthetic.mzML')
+        truth = write_synthetic_run(output_file, 5, peptides=["SAMPLER", "PEPTIDEK"], charges=(2, 3), n_noise=10)
+        assert [x[0] for x in truth] == ["SAMPLER", "PEPTIDEK", "SAMPLER", "PEPTIDEK", "SAMPLER"]
+        assert get_ms2_scan_numbers(output_file) == [0, 1, 2, 3, 4]
+        df, _, pre_mz, pre_charge = parse_data_from_MS2(output_file, 1)
+        assert pre_charge == truth[1][1]
+        assert np.isclose(pre_mz, AASequence.fromString("PEPTIDEK").getMZ(pre_charge))
+        assert write_synthetic_run(output_file, 5, seed=1) == write_synthetic_run(output_file, 5, seed=1)
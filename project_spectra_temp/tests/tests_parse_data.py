@@ -2,7 +2,8 @@
 
 import os
 import pandas as pd
-from project_spectra.Parse_data_MS2 import get_ms2, parse_data_from_MS2
+from project_spectra.Parse_data_MS2 import (get_ms2, get_scan_count, get_spectrum,
+                                           load_experiment, parse_data_from_MS2)
 
 
 class TestParseData:
@@ -25,5 +26,18 @@ class TestParseData:
         assert isinstance(pre_mz, float)
         assert isinstance(pre_charge, int)
 
+    def test_load_experiment(self):
+        """Test function load_experiment"""
+        input_file = "data/test_ms2.mzML"
+        exp = load_experiment(input_file)
+        assert exp.getNrSpectra() > 0
+        assert load_experiment(input_file) is exp
 
-
+    def test_get_spectrum(self):
+        """Test function get_spectrum"""
+        input_file = "data/test_ms2.mzML"
+        exp = load_experiment(input_file)
+        assert get_scan_count(input_file) == exp.getNrSpectra()
+        spec = get_spectrum(input_file, 3)
+        assert list(spec.get_peaks()[0]) == list(exp[3].get_peaks()[0])
+        assert spec.getPrecursors()[0].getMZ() == exp[3].getPrecursors()[0].getMZ()